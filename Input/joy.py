@@ -5,6 +5,15 @@ joy.py: Interface for getting joystick data
 from panda3d.core import InputDevice
 
 buttons = ["a", "b", "x", "y", "rstick", "lstick"]
+axes = ("left_x", "left_y",
+        "right_x", "right_y",
+        "left_trigger", "right_trigger")
+axis_ids = (InputDevice.Axis.left_x,
+            InputDevice.Axis.left_y,
+            InputDevice.Axis.right_x,
+            InputDevice.Axis.right_y,
+            InputDevice.Axis.left_trigger,
+            InputDevice.Axis.right_trigger)
 
 def readJoystickValues(joystick):
   axes_values = readAxesValues(joystick)
@@ -13,21 +22,55 @@ def readJoystickValues(joystick):
 
 def readAxesValues(joystick):
   values = {}
-  names = ("left_x", "left_y", 
-           "right_x", "right_y",
-           "left_trigger", "right_trigger")
-  axis_names = (InputDevice.Axis.left_x,
-                InputDevice.Axis.left_y,
-                InputDevice.Axis.right_x,
-                InputDevice.Axis.right_y,
-                InputDevice.Axis.left_trigger,
-                InputDevice.Axis.right_trigger)
-  for ind in range(len(names)):
-    values[names[ind]] = joystick.findAxis(axis_names[ind]).value
+  for ind in range(len(axes)):
+    values[axes[ind]] = joystick.findAxis(axis_ids[ind]).value
   return values
 
 def readButtonValues(joystick):
   values = {}
   for button in buttons:
     values[button] = joystick.findButton(button).pressed
-  return values
\ No newline at end of file
+  return values
+
+def neutralReadings():
+  """
+  Returns readings for a centered joystick with no buttons pressed
+  """
+  return {"axes": {name: 0.0 for name in axes},
+          "buttons": {button: False for button in buttons}}
+
+class JoystickReader:
+  """
+  Reads a joystick into readings with the same layout as readJoystickValues
+  The device's axis and button states are copied out on every lookup, so their
+  indices are resolved once here, and the readings dicts are reused every frame
+  """
+  def __init__(self, joystick):
+    self.joystick = joystick
+    self.axis_indices = []
+    for name, axis in zip(axes, axis_ids):
+      for index, state in enumerate(joystick.axes):
+        if state.axis == axis:
+          self.axis_indices.append((name, index))
+          break
+    self.button_indices = []
+    for button in buttons:
+      for index, state in enumerate(joystick.buttons):
+        if state.handle.name == button:
+          self.button_indices.append((button, index))
+          break
+    self.readings = neutralReadings()
+
+  def read(self):
+    """
+    Updates self.readings in place from the device, and returns it
+    """
+    device_axes = self.joystick.axes
+    axes_values = self.readings["axes"]
+    for name, index in self.axis_indices:
+      axes_values[name] = device_axes[index].value
+    device_buttons = self.joystick.buttons
+    button_values = self.readings["buttons"]
+    for name, index in self.button_indices:
+      button_values[name] = device_buttons[index].pressed
+    return self.readings
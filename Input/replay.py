@@ -0,0 +1,142 @@
+"""
+replay.py: Records joystick samples to a compact binary log and replays them
+Logs start with a short header, followed by fixed-size little-endian records of
+time (float64), device index (uint8), the six axes (float32) and a button bitmask (uint8)
+Replays never touch Panda3D, so they can run headless and faster than real time
+"""
+
+import argparse
+import struct
+from bisect import bisect_right
+from time import perf_counter
+
+#Axis and button names, in the order they are stored in each record
+#These match Input.joy, which is not imported so that replays do not need Panda3D
+AXES = ("left_x", "left_y", "right_x", "right_y", "left_trigger", "right_trigger")
+BUTTONS = ("a", "b", "x", "y", "rstick", "lstick")
+HEADER = b"JOYLOG1\n"
+RECORD = struct.Struct("<dB6fB")
+DEFAULT_DT = 1/60
+
+
+class InputRecorder:
+  def __init__(self, path):
+    """
+    Starts a new log at path, overwriting any existing log
+    """
+    self.file = open(path, "wb")
+    self.file.write(HEADER)
+
+  def record(self, t, device, readings):
+    """
+    Appends the readings of one device, as returned by joy.readJoystickValues, at time t
+    """
+    axes_values = readings["axes"]
+    button_values = readings["buttons"]
+    mask = 0
+    for bit, button in enumerate(BUTTONS):
+      if button_values[button]:
+        mask |= 1 << bit
+    self.file.write(RECORD.pack(t, device, *(axes_values[axis] for axis in AXES), mask))
+
+  def close(self):
+    self.file.close()
+
+def loadInputLog(path):
+  """
+  Loads a log as a list of (time, device, readings) samples
+  """
+  with open(path, "rb") as f:
+    data = f.read()
+  if not data.startswith(HEADER):
+    raise ValueError("{} is not a joystick log".format(path))
+  samples = []
+  #A partially written last record is ignored
+  end = len(HEADER)+(len(data)-len(HEADER))//RECORD.size*RECORD.size
+  for t, device, *values in RECORD.iter_unpack(data[len(HEADER):end]):
+    mask = values.pop()
+    readings = {"axes": dict(zip(AXES, values)),
+                "buttons": {button: bool(mask & (1 << bit)) for bit, button in enumerate(BUTTONS)}}
+    samples.append((t, device, readings))
+  return samples
+
+class ReplayDevice:
+  def __init__(self, path):
+    """
+    Replays a joystick log, holding each sample until the next one
+    """
+    samples = loadInputLog(path)
+    num_devices = max((device for _, device, _ in samples), default=-1)+1
+    #Sample times and readings, per device
+    self.times = [[] for _ in range(num_devices)]
+    self.readings = [[] for _ in range(num_devices)]
+    for t, device, readings in samples:
+      self.times[device].append(t)
+      self.readings[device].append(readings)
+    self.start_time = min((times[0] for times in self.times if times), default=0)
+    self.end_time = max((times[-1] for times in self.times if times), default=0)
+    self.neutral = {"axes": {axis: 0.0 for axis in AXES},
+                    "buttons": {button: False for button in BUTTONS}}
+
+  def duration(self):
+    return self.end_time-self.start_time
+
+  def readingsAt(self, t):
+    """
+    Returns one reading per device at t seconds after the start of the log
+    Devices are neutral before their first sample, and a log with no samples
+    replays as one neutral device, like joy.readJoysticks with no gamepad connected
+    """
+    if not self.times:
+      return [self.neutral]
+    t += self.start_time
+    readings = []
+    for times, device_readings in zip(self.times, self.readings):
+      ind = bisect_right(times, t)-1
+      readings.append(device_readings[ind] if ind >= 0 else self.neutral)
+    return readings
+
+def readControls(readings):
+  """
+  Maps a joystick reading to the (x, y, z) controls sent to the physics engine
+  Shared with RobotSim.driveRobot, so replays drive exactly like live input
+  """
+  axes_values = readings["axes"]
+  return axes_values["left_x"], axes_values["left_y"], axes_values["right_x"]
+
+def controlAxes(x, y, z):
+  """
+  Returns the axes which readControls maps to the (x, y, z) controls, with the unused axes neutral
+  """
+  axes_values = {axis: 0.0 for axis in AXES}
+  axes_values["left_x"], axes_values["left_y"], axes_values["right_x"] = x, y, z
+  return axes_values
+
+def replayHeadless(path, swerve, delta_time = DEFAULT_DT, callback = None):
+  """
+  Feeds a joystick log into a physics engine at a fixed timestep, mapping the
+  first device to controls the same way RobotSim.driveRobot does
+  If given, callback is called with (tick, swerve) after every step
+  """
+  device = ReplayDevice(path)
+  num_ticks = int(device.duration()/delta_time)+1
+  for tick in range(num_ticks):
+    swerve.sendControls(*readControls(device.readingsAt(tick*delta_time)[0]))
+    swerve.step(delta_time)
+    if callback != None:
+      callback(tick, swerve)
+  return swerve
+
+def main():
+  import Physics.primitivePhysics as physics
+  parser = argparse.ArgumentParser(description="Replays a joystick log through the physics engine headless")
+  parser.add_argument("log")
+  parser.add_argument("--dt", type=float, default=DEFAULT_DT, help="fixed timestep in seconds")
+  args = parser.parse_args()
+  start = perf_counter()
+  swerve = replayHeadless(args.log, physics.Swerve(), args.dt)
+  print("Replayed {}s in {}s".format(round(ReplayDevice(args.log).duration(), 3), round(perf_counter()-start, 3)))
+  print("Position: {}".format(swerve.position))
+
+if __name__ == "__main__":
+  main()
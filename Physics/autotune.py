@@ -0,0 +1,248 @@
+"""
+autotune.py: Tunes the swerve steering and wheel velocity PID gains with headless simulations
+Step and ramp responses of the module loops are simulated for many gain sets at once with a
+PIDBank, split across a process pool. A coarse grid is searched first, then the best grid
+points are refined with Nelder-Mead in parallel. The best gains are saved as a profile,
+with a report of overshoot, rise time and settling time
+Run from the repository root, for example:
+  python -m Physics.autotune --profile default --out-profile tuned
+"""
+
+import argparse
+import os
+from itertools import product
+from math import pi
+from multiprocessing import Pool
+
+import numpy as np
+
+import Physics.manageParams as manageParams
+from Physics.pid import PIDBank
+from Physics.robotModel import RobotModel
+
+#Loops which can be tuned, and the parameters holding their gains
+LOOPS = {"swerve": ("swerve_p", "swerve_i", "swerve_d"),
+         "wheel": ("wheel_p", "wheel_i", "wheel_d")}
+DEFAULT_DT = 1/60
+DEFAULT_SECONDS = 3
+#Step sizes, a quarter turn of the module and full wheel speed
+STEPS = {"swerve": pi/2, "wheel": 1}
+#Fraction of the step the response must stay within to count as settled
+SETTLING_BAND = .02
+#Weights of the ramp tracking error and overshoot against the step response error
+RAMP_WEIGHT = 1
+OVERSHOOT_WEIGHT = 2
+#Timesteps each gain set is scored at, as multiples of the chosen one
+#Scoring at longer steps too keeps the tuner from picking gains which only work at exactly one step,
+#such as deadbeat gains which go unstable as soon as a frame runs long
+DT_SCALES = (1, 2)
+#Gains are searched in log space, so zero gains are searched from this instead
+GAIN_FLOOR = 1e-3
+
+
+def simulate(loop, gains, params, reference, delta_time):
+  """
+  Simulates the loop following reference, one value per tick, for each row of (p, i, d) gains
+  Returns the responses, one row per gain set
+  The steering loop turns the module at its capped rate, like BatchSwerve.updateSteering and
+  physics.Swerve.updateLoops, the wheel loop accelerates the wheel motor like physics.Swerve.updateLoops
+  """
+  gains = np.asarray(gains, dtype=float)
+  n = len(gains)
+  bank = PIDBank(n, gains[:, 0], gains[:, 1], gains[:, 2])
+  model = RobotModel(params)
+  wheel_power = params["voltage"]*params["max_current"]/params["robot_weight"]
+  state = np.zeros(n)
+  responses = np.zeros((n, len(reference)))
+  with np.errstate(all="ignore"):
+    for tick, target in enumerate(reference.tolist()):
+      if loop == "swerve":
+        errors = (target-state+pi)%(2*pi)-pi
+        rates = bank.update(errors, delta_time)
+        state += np.clip(rates, -model.swerve_speed, model.swerve_speed)*delta_time
+      else:
+        state += bank.update(wheel_power*(target-state), delta_time)*delta_time
+      responses[:, tick] = state
+  return responses
+
+def references(loop, params, seconds, delta_time):
+  """
+  Returns the (step, ramp) references for a loop
+  The ramp rises to the step size over the whole run, but never faster than the module can turn
+  """
+  times = np.arange(1, round(seconds/delta_time)+1)*delta_time
+  step = np.full(len(times), STEPS[loop])
+  rate = STEPS[loop]/seconds
+  if loop == "swerve":
+    rate = min(rate, RobotModel(params).swerve_speed/2)
+  return step, times*rate
+
+def responseMetrics(response, step_size, delta_time):
+  """
+  Returns overshoot (percent of the step), rise time (10% to 90%) and settling time, in seconds,
+  for each row of step responses. Responses which never rise or settle use the run's length
+  """
+  length = response.shape[1]*delta_time
+  normalized = np.nan_to_num(response/step_size, nan=np.inf)
+  overshoot = np.maximum(normalized.max(axis=1)-1, 0)*100
+  def firstTime(reached):
+    return np.where(reached.any(axis=1), reached.argmax(axis=1)*delta_time, length)
+  rise_time = firstTime(normalized >= .9)-firstTime(normalized >= .1)
+  outside = np.abs(normalized-1) > SETTLING_BAND
+  last_outside = outside.shape[1]-1-outside[:, ::-1].argmax(axis=1)
+  settling_time = np.where(outside.any(axis=1), (last_outside+1)*delta_time, 0)
+  return {"overshoot": overshoot, "rise_time": rise_time, "settling_time": np.minimum(settling_time, length)}
+
+def evaluate(job):
+  """
+  Scores each row of gains, lower is better, and returns (costs, metrics)
+  Costs are totaled over the DT_SCALES timesteps, metrics are of the chosen timestep
+  """
+  loop, gains, params, seconds, delta_time = job
+  costs, metrics = scoreResponses(loop, gains, params, seconds, delta_time)
+  for scale in DT_SCALES[1:]:
+    costs = costs+scoreResponses(loop, gains, params, seconds, delta_time*scale)[0]
+  return costs, metrics
+
+def scoreResponses(loop, gains, params, seconds, delta_time):
+  """
+  Returns the costs and metrics of each row of gains at one timestep
+  The cost is the time weighted absolute step error, plus the ramp tracking error and an overshoot penalty
+  """
+  step, ramp = references(loop, params, seconds, delta_time)
+  step_response = simulate(loop, gains, params, step, delta_time)
+  ramp_response = simulate(loop, gains, params, ramp, delta_time)
+  times = np.arange(1, len(step)+1)*delta_time
+  with np.errstate(all="ignore"):
+    step_error = (np.abs(step-step_response)*times).sum(axis=1)*delta_time/STEPS[loop]
+    ramp_error = np.sqrt(((ramp-ramp_response)**2).mean(axis=1))/STEPS[loop]
+    metrics = responseMetrics(step_response, STEPS[loop], delta_time)
+    metrics["ramp_error"] = ramp_error
+    costs = step_error+RAMP_WEIGHT*ramp_error+OVERSHOOT_WEIGHT*metrics["overshoot"]/100
+  return np.where(np.isfinite(costs), costs, np.inf), metrics
+
+def gainGrid(size):
+  """
+  Returns a size**3 grid of (p, i, d) gains, spaced evenly in log space, with zero i and d included
+  """
+  p = np.logspace(-1, 1.5, size)
+  i = np.concatenate(([0], np.logspace(-2, 1, size-1)))
+  d = np.concatenate(([0], np.logspace(-3, -.5, size-1)))
+  return np.array(list(product(p, i, d)))
+
+def nelderMead(cost, start, step = np.log(2), iterations = 60):
+  """
+  Minimizes cost, a function of a point in log gain space, from start
+  Returns the best point found and its cost
+  """
+  dims = len(start)
+  simplex = [np.array(start, dtype=float)]
+  for ind in range(dims):
+    point = simplex[0].copy()
+    point[ind] += step
+    simplex.append(point)
+  costs = [cost(point) for point in simplex]
+  for _ in range(iterations):
+    order = np.argsort(costs)
+    simplex = [simplex[ind] for ind in order]
+    costs = [costs[ind] for ind in order]
+    centroid = np.mean(simplex[:-1], axis=0)
+    reflected = centroid+(centroid-simplex[-1])
+    reflected_cost = cost(reflected)
+    if reflected_cost < costs[0]:
+      expanded = centroid+2*(centroid-simplex[-1])
+      expanded_cost = cost(expanded)
+      if expanded_cost < reflected_cost:
+        simplex[-1], costs[-1] = expanded, expanded_cost
+      else:
+        simplex[-1], costs[-1] = reflected, reflected_cost
+    elif reflected_cost < costs[-2]:
+      simplex[-1], costs[-1] = reflected, reflected_cost
+    else:
+      contracted = centroid+(simplex[-1]-centroid)/2
+      contracted_cost = cost(contracted)
+      if contracted_cost < costs[-1]:
+        simplex[-1], costs[-1] = contracted, contracted_cost
+      else:
+        #Shrink towards the best point
+        simplex = [simplex[0]]+[simplex[0]+(point-simplex[0])/2 for point in simplex[1:]]
+        costs = [costs[0]]+[cost(point) for point in simplex[1:]]
+  best = int(np.argmin(costs))
+  return simplex[best], costs[best]
+
+def refine(job):
+  """
+  Refines one starting set of gains with Nelder-Mead, run inside the worker processes
+  """
+  loop, gains, params, seconds, delta_time, iterations = job
+  def cost(point):
+    return evaluate((loop, np.exp(point)[None, :], params, seconds, delta_time))[0][0]
+  point, best_cost = nelderMead(cost, np.log(np.maximum(gains, GAIN_FLOOR)), iterations=iterations)
+  return np.exp(point), best_cost
+
+def tuneLoop(pool, workers, loop, params, seconds = DEFAULT_SECONDS, delta_time = DEFAULT_DT,
+             grid_size = 8, starts = 4, iterations = 60):
+  """
+  Searches a gain grid across the pool, then refines the best starts grid points with Nelder-Mead
+  Returns the best (p, i, d) gains
+  """
+  grid = gainGrid(grid_size)
+  chunks = np.array_split(grid, workers*4)
+  results = pool.map(evaluate, [(loop, chunk, params, seconds, delta_time) for chunk in chunks if len(chunk)])
+  costs = np.concatenate([chunk_costs for chunk_costs, _ in results])
+  best = grid[np.argsort(costs)[:starts]]
+  refined = pool.map(refine, [(loop, gains, params, seconds, delta_time, iterations) for gains in best])
+  gains, cost = min(refined, key=lambda result: result[1])
+  #Refining only moves away from a grid point when it does better
+  if cost > costs.min():
+    gains = grid[np.argmin(costs)]
+  #Gains which refined down to the floor are left off
+  return [0 if gain <= GAIN_FLOOR*1.01 else float(gain) for gain in gains]
+
+def formatReport(loop, before, after, params, seconds, delta_time):
+  """
+  Returns report lines comparing the step and ramp responses of two sets of gains
+  """
+  _, metrics = evaluate((loop, [before, after], params, seconds, delta_time))
+  lines = ["{} loop".format(loop)]
+  for name, gains, ind in (("before", before, 0), ("after", after, 1)):
+    lines.append("  {:<7} p {:.4g}  i {:.4g}  d {:.4g}".format(name, *gains))
+    lines.append("          overshoot {:.1f}%  rise time {:.3f}s  settling time {:.3f}s  ramp error {:.4f}"
+                 .format(metrics["overshoot"][ind], metrics["rise_time"][ind],
+                         metrics["settling_time"][ind], metrics["ramp_error"][ind]))
+  return lines
+
+def main():
+  parser = argparse.ArgumentParser(description="Tunes the swerve and wheel PID gains with headless simulations")
+  parser.add_argument("--loop", choices=tuple(LOOPS)+("both",), default="both")
+  parser.add_argument("--profile", default=manageParams.DEFAULT_PROFILE, choices=manageParams.listProfiles(),
+                      help="profile to start from, which the tuned profile copies")
+  parser.add_argument("--out-profile", default="tuned", help="name of the profile to write the gains to")
+  parser.add_argument("--seconds", type=float, default=DEFAULT_SECONDS, help="length of each response")
+  parser.add_argument("--dt", type=float, default=DEFAULT_DT, help="fixed timestep in seconds")
+  parser.add_argument("--grid-size", type=int, default=8, help="grid points per gain")
+  parser.add_argument("--starts", type=int, default=4, help="grid points refined with Nelder-Mead")
+  parser.add_argument("--iterations", type=int, default=60, help="Nelder-Mead iterations per start")
+  parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to one per core")
+  parser.add_argument("--report", default="autotune_report.txt")
+  args = parser.parse_args()
+  params = manageParams.loadProfile(args.profile)
+  overrides = manageParams.loadOverrides(args.profile)
+  loops = tuple(LOOPS) if args.loop == "both" else (args.loop,)
+  workers = args.workers or os.cpu_count()
+  lines = ["Tuned from profile {}, {}s responses at dt {}".format(args.profile, args.seconds, args.dt)]
+  with Pool(workers) as pool:
+    for loop in loops:
+      before = [params[name] for name in LOOPS[loop]]
+      after = tuneLoop(pool, workers, loop, params, args.seconds, args.dt,
+                       args.grid_size, args.starts, args.iterations)
+      overrides.update(zip(LOOPS[loop], after))
+      lines += formatReport(loop, before, after, params, args.seconds, args.dt)
+  path = manageParams.saveProfile(args.out_profile, overrides)
+  lines.append("Wrote profile {}".format(path))
+  with open(args.report, "w") as f:
+    f.write("\n".join(lines)+"\n")
+  print("\n".join(lines))
+
+if __name__ == "__main__":
+  main()
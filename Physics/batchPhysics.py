@@ -0,0 +1,275 @@
+"""
+batchPhysics.py: Vectorized version of the primitive swerve drive physics engine
+Simulates many robots at once, with each robot's state stored in rows of NumPy arrays
+"""
+
+from math import ceil, pi
+
+import numpy as np
+
+import Physics.primitivePhysics as physics
+from Physics.pid import PIDBank
+from Physics.robotModel import RobotModel
+
+#Module order used by every (n_robots, 4) array
+MODULES = ("fr", "br", "fl", "bl")
+
+
+class BatchSwerve:
+  def __init__(self, n_robots, start_positions = None, integrator = "semi-implicit", max_dt = None, models = None,
+               steering = False):
+    """
+    Creates n_robots robots, which all use the equations of primitivePhysics.Swerve
+    start_positions is an optional (n_robots, 3) array of x, y, direction
+    models is a RobotModel shared by every robot, or a list with one per robot,
+    defaulting to primitivePhysics.default_model
+    integrator and max_dt work as they do for primitivePhysics.Swerve
+    With steering, the modules turn toward the swerve target through PID loops using each
+    model's swerve gains, no faster than rpm_swerve, instead of snapping to it
+    """
+    if integrator not in physics.INTEGRATORS:
+      raise ValueError("Unknown integrator: {}".format(integrator))
+    self.integrator = integrator
+    self.max_dt = max_dt
+    self.n_robots = n_robots
+    #Position is x, y, direction for every robot
+    self.position = np.zeros((n_robots, 3))
+    if start_positions is not None:
+      self.position[:] = start_positions
+    #Swerve Wheel Targets
+    self.swerve_target = np.zeros(n_robots)
+    #Swerve positions work in radians, wheel positions in Panda grid units
+    self.swerve_positions = np.zeros((n_robots, 4))
+    self.wheel_positions = np.zeros((n_robots, 4))
+    self.motor_velocities = np.zeros((n_robots, 4))
+    #Polar drive vectors produced by the wheel motors
+    self.wheel_magnitudes = np.zeros((n_robots, 4))
+    self.wheel_directions = np.zeros((n_robots, 4))
+    #Cartesian velocities of each wheel, and their rolling velocities
+    self.wheel_velocities = np.zeros((n_robots, 4, 2))
+    self.rolling_velocities = np.zeros((n_robots, 4))
+    #Cartesian force and friction applied to each frame
+    self.frame_force = np.zeros((n_robots, 2))
+    self.frame_friction = np.zeros((n_robots, 2))
+    self.frame_velocity = np.zeros((n_robots, 2))
+    self.z_acceleration = np.zeros(n_robots)
+    self.z_friction = np.zeros(n_robots)
+    self.z_velocity = np.zeros(n_robots)
+    self.steering = None
+    self.loadConstants(models)
+    if steering:
+      #One loop per module, in the order of swerve_positions.ravel()
+      gains = np.repeat(np.array([model.swerve_gains for model in self.models]), 4, axis=0)
+      self.steering = PIDBank(n_robots*4, gains[:, 0], gains[:, 1], gains[:, 2])
+
+  def loadConstants(self, models = None):
+    """
+    Gathers the constants of each robot's model into arrays with one row per robot
+    """
+    if models is None:
+      models = physics.default_model
+    if isinstance(models, RobotModel):
+      models = [models]*self.n_robots
+    if len(models) != self.n_robots:
+      raise ValueError("Expected {} models, got {}".format(self.n_robots, len(models)))
+    self.models = list(models)
+    self.angles = np.array([model.angle_list for model in models])
+    self.torques = np.array([model.torque_list for model in models])
+    #Columns, so they broadcast across the four modules
+    self.drive_constant = np.array([[model.drive_constant] for model in models])
+    self.wheel_resistance = np.array([[model.wheel_resistance] for model in models])
+    self.module_load = np.array([model.module_load for model in models])
+    self.module_friction = np.array([model.findFrictionCoef(0)*model.module_load for model in models])
+    #Robots using the tire model, grouped by model so each group is looked up with one call
+    self.tire_groups = []
+    for model in dict.fromkeys(model for model in models if model.tire != None):
+      rows = np.array([ind for ind, other in enumerate(models) if other is model])
+      self.tire_groups.append((model.tire, rows))
+    self.friction_magnitude = 4*self.module_friction
+    self.z_friction_magnitude = np.array([model.z_friction for model in models])
+    self.swerve_speed = np.array([[model.swerve_speed] for model in models])
+
+  def setModels(self, models):
+    """
+    Switches the robots to other models, which take effect from the next step
+    """
+    self.loadConstants(models)
+
+  def step(self, delta_time):
+    """
+    Advances every robot by a fixed delta_time, in seconds
+    Steps longer than max_dt are split into equal sub-steps
+    """
+    if self.max_dt and delta_time > self.max_dt:
+      n_steps = ceil(delta_time/self.max_dt)
+      for _ in range(n_steps):
+        self.integrate(delta_time/n_steps)
+    else:
+      self.integrate(delta_time)
+
+  def integrate(self, delta_time):
+    """
+    Advances every robot by one step of delta_time with the chosen integrator
+    """
+    if self.steering != None:
+      self.updateSteering(delta_time)
+    self.updateVectors()
+    if self.integrator == "rk4":
+      self.updateWheelVelocities(delta_time)
+      self.integrateFrameRK4(delta_time)
+      self.wheel_positions += self.rolling_velocities*delta_time
+    elif self.integrator == "euler":
+      frame_velocity = self.frame_velocity.copy()
+      z_velocity = self.z_velocity.copy()
+      self.updateVelocities(delta_time)
+      self.position[:, 0:2] += frame_velocity*delta_time
+      self.position[:, 2] += z_velocity*delta_time
+      self.wheel_positions += self.rolling_velocities*delta_time
+    else:
+      self.updateVelocities(delta_time)
+      self.updatePositions(delta_time)
+
+  def advance(self, n_steps, delta_time):
+    """
+    Steps every robot n_steps times by delta_time, holding the current controls
+    """
+    for _ in range(n_steps):
+      self.step(delta_time)
+
+  def updateSteering(self, delta_time):
+    """
+    Turns the swerve modules toward their targets with one update of the steering loops
+    """
+    #Errors take the short way around
+    errors = (self.swerve_target[:, None]-self.swerve_positions+pi)%(2*pi)-pi
+    rates = self.steering.update(errors.ravel(), delta_time).reshape(self.n_robots, 4)
+    self.swerve_positions += np.clip(rates, -self.swerve_speed, self.swerve_speed)*delta_time
+
+  def updateVectors(self):
+    """
+    Updates the wheel drive vectors and the forces they apply to the frames
+    """
+    #Wheel drive vectors, matching Swerve.updateWheelVectors
+    active = self.motor_velocities > .05
+    self.wheel_magnitudes = np.where(active, self.drive_constant*self.motor_velocities, 0.0)
+    self.wheel_directions = np.where(active, self.swerve_positions, 0.0)
+    for tire, rows in self.tire_groups:
+      #The wheels can only push as hard as their slip ratios allow
+      directions = self.swerve_positions[rows]
+      velocity = self.frame_velocity[rows]
+      long_velocity = velocity[:, 0, None]*np.cos(directions)+velocity[:, 1, None]*np.sin(directions)
+      magnitudes = self.wheel_magnitudes[rows]
+      traction = tire.slipForces(tire.slipRatios(magnitudes, long_velocity))*self.module_load[rows, None]
+      self.wheel_magnitudes[rows] = np.minimum(magnitudes, np.maximum(traction, 0))
+    #Frame force, matching Swerve.updateFrameVectors
+    offset = self.wheel_directions-self.angles
+    self.z_acceleration = (self.wheel_magnitudes*np.sin(offset)*self.torques).sum(axis=1)
+    transferred = self.wheel_magnitudes*np.cos(offset)
+    self.frame_force[:, 0] = (transferred*np.cos(self.angles)).sum(axis=1)
+    self.frame_force[:, 1] = (transferred*np.sin(self.angles)).sum(axis=1)
+    #Frame friction, matching Swerve.updateFrameFrictionVectors
+    for tire, rows in self.tire_groups:
+      force_direction = np.arctan2(self.frame_force[rows, 1], self.frame_force[rows, 0])
+      coefs = tire.skidCoefs(self.swerve_positions[rows]-force_direction[:, None])
+      self.friction_magnitude[rows] = coefs.sum(axis=1)*self.module_load[rows]
+    direction = np.arctan2(self.frame_velocity[:, 1], self.frame_velocity[:, 0])-pi
+    self.frame_friction[:, 0] = self.friction_magnitude*np.cos(direction)
+    self.frame_friction[:, 1] = self.friction_magnitude*np.sin(direction)
+    self.z_friction = -np.sign(self.z_velocity)*self.z_friction_magnitude
+
+  def updateVelocities(self, delta_time):
+    self.updateWheelVelocities(delta_time)
+    self.updateFrameVelocity(delta_time)
+
+  def updateWheelVelocities(self, delta_time):
+    #The resistance vector points opposite the drive vector, so their sum stays on the same line
+    cos_dir = np.cos(self.wheel_directions)
+    sin_dir = np.sin(self.wheel_directions)
+    total_x = (self.wheel_magnitudes-self.wheel_resistance)*cos_dir
+    total_y = (self.wheel_magnitudes-self.wheel_resistance)*sin_dir
+    magnitude = np.hypot(total_x, total_y)
+    delta = np.stack((magnitude*delta_time*cos_dir, magnitude*delta_time*sin_dir), axis=2)
+    self.wheel_velocities += delta
+    #TODO: This is not derived from real physics
+    speed_squared = (self.frame_velocity**2).sum(axis=1)
+    self.rolling_velocities = (-self.motor_velocities-speed_squared[:, None])*.4
+    #Resistance may only pull velocities towards zero
+    resisted = (self.wheel_magnitudes < self.wheel_resistance)[:, :, None]
+    overshoot = ((delta > 0) & (self.wheel_velocities > 0)) | ((delta < 0) & (self.wheel_velocities < 0))
+    self.wheel_velocities[resisted & overshoot] = 0
+
+  def updateFrameVelocity(self, delta_time):
+    delta = (self.frame_force+self.frame_friction)*delta_time
+    delta_z = (self.z_acceleration+self.z_friction)*delta_time
+    self.frame_velocity += delta
+    self.z_velocity += delta_z
+    self.clampFrameVelocity(delta)
+
+  def clampFrameVelocity(self, delta):
+    """
+    Stops friction from reversing the robots, after velocities have changed by delta
+    """
+    #If the resistance vectors have taken over
+    #only allow them to pull velocity towards zero
+    resisted = (np.hypot(self.frame_force[:, 0], self.frame_force[:, 1])
+                < np.hypot(self.frame_friction[:, 0], self.frame_friction[:, 1]))[:, None]
+    overshoot = ((delta > 0) & (self.frame_velocity > 0)) | ((delta < 0) & (self.frame_velocity < 0))
+    self.frame_velocity[resisted & overshoot] = 0
+    resisted_z = np.abs(self.z_acceleration) < np.abs(self.z_friction)
+    overshoot_z = ((self.z_friction > 0) & (self.z_velocity > 0)) | ((self.z_friction < 0) & (self.z_velocity < 0))
+    self.z_velocity[resisted_z & overshoot_z] = 0
+
+  def integrateFrameRK4(self, delta_time):
+    """
+    Vectorized version of Swerve.integrateFrameRK4
+    """
+    friction = self.friction_magnitude[:, None]
+    def accelerations(velocity, z_velocity):
+      direction = np.arctan2(velocity[:, 1], velocity[:, 0])-pi
+      acceleration = self.frame_force+friction*np.stack((np.cos(direction), np.sin(direction)), axis=1)
+      return acceleration, self.z_acceleration-np.sign(z_velocity)*self.z_friction_magnitude
+    v1, z1 = self.frame_velocity, self.z_velocity
+    a1, za1 = accelerations(v1, z1)
+    v2, z2 = v1+delta_time/2*a1, z1+delta_time/2*za1
+    a2, za2 = accelerations(v2, z2)
+    v3, z3 = v1+delta_time/2*a2, z1+delta_time/2*za2
+    a3, za3 = accelerations(v3, z3)
+    v4, z4 = v1+delta_time*a3, z1+delta_time*za3
+    a4, za4 = accelerations(v4, z4)
+    self.position[:, 0:2] += delta_time/6*(v1+2*v2+2*v3+v4)
+    self.position[:, 2] += delta_time/6*(z1+2*z2+2*z3+z4)
+    delta = delta_time/6*(a1+2*a2+2*a3+a4)
+    self.frame_velocity = v1+delta
+    self.z_velocity = z1+delta_time/6*(za1+2*za2+2*za3+za4)
+    self.clampFrameVelocity(delta)
+
+  def updatePositions(self, delta_time):
+    """
+    Updates the wheel and robot positions based on velocity data
+    """
+    self.position[:, 0:2] += self.frame_velocity*delta_time
+    self.position[:, 2] += self.z_velocity*delta_time
+    self.wheel_positions += self.rolling_velocities*delta_time
+
+  def sendControls(self, x = 0, y = 0, z = 0, rnd = 2):
+    """
+    Sets motor velocites for every robot based on the given controls
+    Controls may be scalars, or arrays with one value per robot
+    Rounds controls to the (rnd) decimal to prevent noise problems
+    """
+    x = np.round(np.broadcast_to(np.asarray(x, dtype=float), (self.n_robots,)), rnd)
+    y = np.round(np.broadcast_to(np.asarray(y, dtype=float), (self.n_robots,)), rnd)
+    z = np.round(np.broadcast_to(np.asarray(z, dtype=float), (self.n_robots,)), rnd)
+    magnitude = np.hypot(x, y)
+    direction = np.arctan2(y, x)
+    self.arcadeDrive(z, magnitude)
+    swerving = np.abs(x+y) >= .1
+    self.swerve_target[swerving] = direction[swerving]
+    if self.steering == None:
+      self.swerve_positions[swerving] = direction[swerving, None]
+
+  def arcadeDrive(self, x, y):
+    self.motor_velocities[:, 0] = y+x
+    self.motor_velocities[:, 1] = y+x
+    self.motor_velocities[:, 2] = y-x
+    self.motor_velocities[:, 3] = y-x
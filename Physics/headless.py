@@ -0,0 +1,93 @@
+"""
+headless.py: Runs the swerve physics engine at a fixed timestep without Panda3D
+"""
+
+import argparse
+import csv
+from time import perf_counter
+
+import Physics.manageParams as manageParams
+import Physics.primitivePhysics as physics
+
+#Default fixed timestep, in seconds
+DEFAULT_DT = 1/60
+
+
+def runControls(swerve, controls, delta_time = DEFAULT_DT, callback = None):
+  """
+  Sends one (x, y, z) control tuple per tick to the swerve and steps it by delta_time
+  If given, callback is called with (tick, swerve) after every step
+  """
+  for tick, (x, y, z) in enumerate(controls):
+    swerve.sendControls(x, y, z)
+    swerve.step(delta_time)
+    if callback != None:
+      callback(tick, swerve)
+  return swerve
+
+def runTrace(swerve, trace, delta_time = DEFAULT_DT, callback = None):
+  """
+  Runs a trace of (seconds, x, y, z) segments, holding each control for its duration
+  If given, callback is called with (tick, swerve) after every step
+  """
+  tick = 0
+  for seconds, x, y, z in trace:
+    swerve.sendControls(x, y, z)
+    for _ in range(round(seconds/delta_time)):
+      swerve.step(delta_time)
+      if callback != None:
+        callback(tick, swerve)
+      tick += 1
+  return swerve
+
+def traceControls(trace, t):
+  """
+  Returns the (x, y, z) controls a trace holds at t seconds, or no controls once it has ended
+  """
+  for seconds, x, y, z in trace:
+    if t < seconds:
+      return x, y, z
+    t -= seconds
+  return 0, 0, 0
+
+def loadTrace(path):
+  """
+  Loads a trace from a csv file with one "seconds, x, y, z" segment per row
+  Blank rows and rows starting with # are ignored
+  """
+  trace = []
+  with open(path, newline="") as f:
+    for row in csv.reader(f):
+      if not row or row[0].strip().startswith("#"):
+        continue
+      seconds, x, y, z = (float(value) for value in row)
+      trace.append((seconds, x, y, z))
+  return trace
+
+def main():
+  parser = argparse.ArgumentParser(description="Runs the swerve physics engine headless at a fixed timestep")
+  parser.add_argument("--trace", help="csv file of 'seconds, x, y, z' control segments")
+  parser.add_argument("--seconds", type=float, default=60, help="duration to hold the constant controls")
+  parser.add_argument("-x", type=float, default=0)
+  parser.add_argument("-y", type=float, default=1)
+  parser.add_argument("-z", type=float, default=0)
+  parser.add_argument("--dt", type=float, default=DEFAULT_DT, help="fixed timestep in seconds")
+  parser.add_argument("--integrator", choices=physics.INTEGRATORS, default="semi-implicit")
+  parser.add_argument("--max-dt", type=float, default=None, help="split steps longer than this into sub-steps")
+  parser.add_argument("--profile", default=manageParams.DEFAULT_PROFILE, choices=manageParams.listProfiles(),
+                      help="physics parameter profile from Physics/profiles")
+  args = parser.parse_args()
+  if args.trace:
+    trace = loadTrace(args.trace)
+  else:
+    trace = [(args.seconds, args.x, args.y, args.z)]
+  swerve = physics.Swerve(integrator=args.integrator, max_dt=args.max_dt, model=manageParams.buildModel(args.profile))
+  start = perf_counter()
+  runTrace(swerve, trace, args.dt)
+  elapsed = perf_counter()-start
+  simulated = sum(segment[0] for segment in trace)
+  print("Simulated {}s in {}s".format(round(simulated, 3), round(elapsed, 3)))
+  print("Position: {}".format(swerve.position))
+
+if __name__ == "__main__":
+  main()
@@ -1,9 +1,145 @@
 """
 manageParams.py: Interface for profiled physics parameter management
 6/27/2019 Holiday Pettijohn
+Profiles are json files in Physics/profiles, named after the file. Each one holds
+only the parameters it changes, which are laid over params.json
 """
 
+import json
+import os
+from time import perf_counter
+
+import Physics.primitivePhysics as physics
+from Physics.robotModel import RobotModel
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+DEFAULT_PROFILE = "default"
+#Seconds between checks of the watched files
+POLL_INTERVAL = .5
+#Errors from loading a profile which is missing, malformed, or holds values of the wrong type
+LOAD_ERRORS = (OSError, ValueError, TypeError, KeyError)
+
+
+def profilePath(profile):
+  return os.path.join(PROFILE_DIR, profile+".json")
+
+def listProfiles():
+  """
+  Returns the names of the saved profiles, in alphabetical order
+  """
+  if not os.path.isdir(PROFILE_DIR):
+    return []
+  return sorted(name[:-5] for name in os.listdir(PROFILE_DIR) if name.endswith(".json"))
+
+def loadOverrides(profile):
+  """
+  Returns only the parameters a profile sets
+  """
+  with open(profilePath(profile)) as f:
+    return json.load(f)
+
+def loadProfile(profile):
+  """
+  Returns the full parameter set of a profile, which is params.json with the profile's values laid over it
+  Raises ValueError if the profile sets a parameter params.json does not have
+  """
+  params = physics.loadParams()
+  overrides = loadOverrides(profile)
+  unknown = set(overrides)-set(params)
+  if unknown:
+    raise ValueError("Unknown physics parameters in {}: {}".format(profile, ", ".join(sorted(unknown))))
+  params.update(overrides)
+  return params
+
+def buildModel(profile):
+  return RobotModel(loadProfile(profile), profile)
+
+def saveProfile(profile, overrides):
+  """
+  Writes the given parameters as a profile, replacing any profile of the same name
+  The file is replaced in one step, so a watcher never reads it half written
+  """
+  os.makedirs(PROFILE_DIR, exist_ok=True)
+  path = profilePath(profile)
+  with open(path+".tmp", "w") as f:
+    json.dump(overrides, f, indent=1, sort_keys=True)
+  os.replace(path+".tmp", path)
+  return path
+
 def setToProfile(profile):
   """
-  Sets params.json to the parameters specified by the profile
+  Sets the default physics parameters to the parameters specified by the profile
+  Returns the profile's RobotModel, which Swerves created before the change can be given with setModel
   """
+  model = buildModel(profile)
+  physics.setParams(model.params)
+  return model
+
+class ProfileWatcher:
+  def __init__(self, profile = DEFAULT_PROFILE):
+    """
+    Polls a profile and params.json for changes, and rebuilds the profile's model when either changes
+    """
+    self.profile = profile
+    self.model = buildModel(profile)
+    self.stamps = self.readStamps()
+    self.last_poll = perf_counter()
+
+  def files(self):
+    return (physics.PARAMS_PATH, profilePath(self.profile))
+
+  def readStamps(self):
+    stamps = []
+    for path in self.files():
+      try:
+        stat = os.stat(path)
+        stamps.append((stat.st_mtime_ns, stat.st_size))
+      except OSError:
+        stamps.append(None)
+    return stamps
+
+  def setProfile(self, profile):
+    """
+    Switches to watching another profile, and returns its model
+    """
+    model = buildModel(profile)
+    self.profile = profile
+    self.model = model
+    self.stamps = self.readStamps()
+    return model
+
+  def nextProfile(self):
+    """
+    Switches to the profile after the current one, in alphabetical order, and returns its model
+    Raises ValueError if there are no profiles
+    """
+    profiles = listProfiles()
+    if not profiles:
+      raise ValueError("No profiles in {}".format(PROFILE_DIR))
+    if self.profile in profiles:
+      profile = profiles[(profiles.index(self.profile)+1)%len(profiles)]
+    else:
+      profile = profiles[0]
+    return self.setProfile(profile)
+
+  def poll(self):
+    """
+    Returns a rebuilt model if the watched files changed since the last poll, otherwise None
+    Checks at most once every POLL_INTERVAL seconds
+    A file which fails to load, such as one caught mid-save, keeps the previous model
+    until it is saved again
+    """
+    now = perf_counter()
+    if now-self.last_poll < POLL_INTERVAL:
+      return None
+    self.last_poll = now
+    stamps = self.readStamps()
+    if stamps == self.stamps:
+      return None
+    self.stamps = stamps
+    try:
+      self.model = buildModel(self.profile)
+    except LOAD_ERRORS as error:
+      print("Could not reload profile {}: {}".format(self.profile, error))
+      return None
+    return self.model
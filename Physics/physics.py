@@ -4,24 +4,52 @@ physics.py: Physics calculator for swerve drive
 """
 
 import json
-from math import atan2, sqrt
+import os
+from math import atan2, pi, sqrt
 from time import time
 
-import pid
+import numpy as np
+
+from Physics.pid import PIDBank
+from Physics.robotModel import RobotModel
+
+SWERVES = ("frswerve", "brswerve", "flswerve", "blswerve")
+WHEELS = ("frwheel", "brwheel", "flwheel", "blwheel")
+
+
+def loadParams():
+  f = open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "params.json"))
+  params = json.load(f)
+  f.close()
+  return params
 
 params = loadParams()
 
 class Swerve:
-  def __init__(self, start_position = (0, 0, 0)):
+  def __init__(self, start_position = (0, 0, 0), clock = time, params = params):
+    """
+    clock is only read by the updates which are not given a delta_time
+    params defaults to params.json, and can be a profile's, from manageParams.loadProfile
+    """
     #Position is x, y, direction
     self.position = list(start_position)
     #Swerve Wheel Target
     self.swerve_target = 0
+    #Wheel velocity targets, set by arcadeDrive
+    self.wheel_targets = np.zeros(len(WHEELS))
+    self.clock = clock
     #Last update time - used for velocity motion calculations
-    self.last_time = time()
-    #Swerve Wheel PID
-    self.swerve_pid = pid.PID(params["swerve_p"], params["swerve_i"], params["swerve_d"])
-    #TODO: Velocity PID
+    self.last_time = clock()
+    self.last_loop_time = self.last_time
+    #Swerve steering loops followed by wheel velocity loops, all updated in one call
+    self.pids = PIDBank(len(SWERVES)+len(WHEELS),
+                        [params["swerve_p"]]*len(SWERVES)+[params["wheel_p"]]*len(WHEELS),
+                        [params["swerve_i"]]*len(SWERVES)+[params["wheel_i"]]*len(WHEELS),
+                        [params["swerve_d"]]*len(SWERVES)+[params["wheel_d"]]*len(WHEELS))
+    #The fastest the swerve modules turn, in radians per second
+    self.swerve_speed = RobotModel(params).swerve_speed
+    #Motor power per unit of motor velocity
+    self.wheel_power = params["voltage"]*params["max_current"]/params["robot_weight"]
     #Wheel encoders work in Panda grid units
     #Swerve encoders work in radians
     self.encoders = {"frwheel": 0,
@@ -31,7 +59,7 @@ class Swerve:
                      "frswerve": 0,
                      "brswerve": 0,
                      "flswerve": 0,
-                     "brswerve": 0}
+                     "blswerve": 0}
     #Vectors are stored as 2D [magnitude, radian] pairs
     self.vectors = {"frwheel": [0, 0],
                     "brwheel": [0, 0],
@@ -40,7 +68,7 @@ class Swerve:
                     "frswerve": [0, 0],
                     "brswerve": [0, 0],
                     "flswerve": [0, 0],
-                    "brswerve": [0, 0],
+                    "blswerve": [0, 0],
                     "frame": [0, 0]}
     self.motor_velocities = {"frwheel": 0,
                              "brwheel": 0,
@@ -49,55 +77,66 @@ class Swerve:
                              "frswerve": 0,
                              "brswerve": 0,
                              "flswerve": 0,
-                             "brswerve": 0}
+                             "blswerve": 0}
 
-  def update(self):
+  def update(self, delta_time = None):
     """
     Calculates the effects of physics given the motor velocites and time passed
+    Time passed is read from the clock unless delta_time is given
     """
-    t = time()
-    delta_time = t-self.last_time
-    self.last_time = t
-    wheel_power = params["voltage"]*params["max_current"]
-    frswerve_motor_velocity = (wheel_power*self.motor_velocities["frswerve"])/params["robot_weight"]
-    brswerve_motor_velocity = (wheel_power*self.motor_velocities["brswerve"])/params["robot_weight"]
-    flswerve_motor_velocity = (wheel_power*self.motor_velocities["flswerve"])/params["robot_weight"]
-    blswerve_motor_velocity = (wheel_power*self.motor_velocities["blswerve"])/params["robot_weight"]
-    self.encoders["frswerve"] += frswerve_motor_velocity*delta_time
-    self.encoders["brswerve"] += brswerve_motor_velocity*delta_time
-    self.encoders["flswerve"] += flswerve_motor_velocity*delta_time
-    self.encoders["blswerve"] += blswerve_motor_velocity*delta_time
+    if delta_time == None:
+      t = self.clock()
+      delta_time = t-self.last_time
+      self.last_time = t
+    #Swerve motor velocities are turn rates, like BatchSwerve's steering
+    for swerve in SWERVES:
+      self.encoders[swerve] += self.motor_velocities[swerve]*delta_time
+    for wheel in WHEELS:
+      self.encoders[wheel] += self.wheel_power*self.motor_velocities[wheel]*delta_time
 
-  def sendControls(self, x, y, z):
+  def sendControls(self, x, y, z, delta_time = None):
     """
     Sets motor velocites based on the given controls
+    delta_time is the time since the loops were last updated, read from the clock if not given
     """
     magnitude = sqrt(x**2+y**2)
     direction = atan2(y, x)
     twist = z
     self.arcadeDrive(twist, magnitude)
-    self.swerve_target = direction
-    self.swerveWheelsTo(direction)
+    self.swerveWheelsTo(direction, delta_time)
   
   def arcadeDrive(self, x, y):
+    """
+    Sets the wheel velocity targets, which the wheel velocity loops drive the wheels to
+    """
     right = x+y
     left = x-y
-    self.motor_velocities["frwheel"] = right
-    self.motor_velocities["brwheel"] = right
-    self.motor_velocities["flwheel"] = left
-    self.motor_velocities["blwheel"] = left
+    self.wheel_targets[:] = (right, right, left, left)
 
-  def swerveWheelsTo(self, direction):
+  def swerveWheelsTo(self, direction, delta_time = None):
     """
-    Uses a pid loop to swerve wheels to a certain position
+    Uses pid loops to swerve wheels to a certain position
+    The wheel velocity loops are updated in the same call
     """
-    motors = ["frswerve", "brswerve", "flswerve", "blswerve"]
-    velocity = self.swerve_pid.update(error = self.swerve_target-self.encoders["frswerve"])
-    for motor in motors:
-      self.motor_velocities[motor] = velocity
+    self.swerve_target = direction
+    self.updateLoops(delta_time)
 
-def loadParams():
-  f = open("params.json")
-  params = json.load(f)
-  f.close()
-  return params
+  def updateLoops(self, delta_time = None):
+    """
+    Updates every steering and wheel velocity loop at once, and sets the motor velocities they output
+    Time passed is read from the clock unless delta_time is given
+    """
+    if delta_time == None:
+      t = self.clock()
+      delta_time = t-self.last_loop_time
+      self.last_loop_time = t
+    #Steering errors take the short way around
+    steering = [(self.swerve_target-self.encoders[swerve]+pi)%(2*pi)-pi for swerve in SWERVES]
+    wheels = [self.wheel_power*(target-self.motor_velocities[wheel])
+              for wheel, target in zip(WHEELS, self.wheel_targets.tolist())]
+    outputs = self.pids.update(steering+wheels, delta_time).tolist()
+    #Steering loops set the swerve turn rates, capped at swerve_speed, wheel velocity loops accelerate the wheel motors
+    for swerve, output in zip(SWERVES, outputs[:len(SWERVES)]):
+      self.motor_velocities[swerve] = min(max(output, -self.swerve_speed), self.swerve_speed)
+    for wheel, output in zip(WHEELS, outputs[len(SWERVES):]):
+      self.motor_velocities[wheel] += output*delta_time
@@ -0,0 +1,200 @@
+"""
+physicsProcess.py: Runs the swerve physics in its own process at a fixed rate
+The render process sends controls and reads back the published state through
+shared memory, so slow frames no longer change the physics time step
+Both sides of the shared memory are guarded by sequence counters (seqlocks), so
+a reader never sees a half written block and the writer never waits on a reader
+"""
+
+from math import pi
+from multiprocessing import Pipe, Process, RawArray
+from time import perf_counter, sleep
+
+import numpy as np
+
+import Physics.primitivePhysics as physics
+from Physics.vectors import FastVector
+
+DEFAULT_RATE = 1000
+#Published state fields, named like the telemetry columns
+STATE = ("time", "x", "y", "rotation",
+         "velocity_x", "velocity_y", "z_velocity", "z_acceleration",
+         "frame_magnitude", "frame_direction",
+         "frswerve", "brswerve", "flswerve", "blswerve",
+         "frwheel", "brwheel", "flwheel", "blwheel")
+#Fields which are angles that wrap around, and should be interpolated the short way
+WRAPPED = (STATE.index("frame_direction"),) + tuple(range(STATE.index("frswerve"), STATE.index("blswerve")+1))
+#Controls block: x, y, z and whether the physics loop should keep running
+CONTROLS = ("x", "y", "z", "running")
+#If the loop falls further behind than this, in seconds, it skips ahead instead of catching up
+MAX_LAG = .25
+
+
+class SeqBlock:
+  def __init__(self, raw):
+    """
+    Single writer, many reader view of a shared RawArray of doubles
+    Element 0 is a sequence counter, which is odd while a write is in progress
+    """
+    self.raw = raw
+    self.array = np.frombuffer(raw, dtype=np.float64)
+
+  @classmethod
+  def create(cls, size):
+    return cls(RawArray("d", size+1))
+
+  def write(self, values, start = 0):
+    """
+    Writes values into the block, beginning at index start of the data
+    """
+    self.array[0] += 1
+    self.array[1+start:1+start+len(values)] = values
+    self.array[0] += 1
+
+  def read(self):
+    """
+    Returns a consistent copy of the data, retrying if a write overlapped the copy
+    """
+    array = self.array
+    while True:
+      seq = array[0]
+      if seq % 2:
+        continue
+      values = array[1:].copy()
+      if array[0] == seq:
+        return values
+
+def readState(swerve, t):
+  """
+  Flattens a primitivePhysics.Swerve into the STATE fields
+  """
+  positions = swerve.positions
+  frame_velocity = swerve.velocities["frame"]
+  frame_vector = swerve.vectors["frame"]
+  return (t, swerve.position[0], swerve.position[1], swerve.position[2],
+          frame_velocity[0], frame_velocity[1], swerve.z_velocity, swerve.z_acceleration,
+          frame_vector.magnitude, frame_vector.direction,
+          positions["frswerve"], positions["brswerve"], positions["flswerve"], positions["blswerve"],
+          positions["frwheel"], positions["brwheel"], positions["flwheel"], positions["blwheel"])
+
+def runPhysics(controls_raw, state_raw, rate, start_position, model = None, models = None):
+  """
+  The physics loop, run in the child process
+  Steps at a fixed 1/rate seconds, catching up with extra steps when the OS sleeps too long,
+  and publishes the previous and current state after every step
+  The state block holds the previous state, the current state and the wall time it was published
+  RobotModels sent through the models pipe replace the robot's model between steps
+  """
+  controls = SeqBlock(controls_raw)
+  state = SeqBlock(state_raw)
+  swerve = physics.Swerve(start_position, model=model)
+  delta_time = 1/rate
+  last_controls = None
+  current = readState(swerve, 0)
+  tick = 0
+  next_time = perf_counter()
+  while True:
+    x, y, z, running = controls.read()
+    if not running:
+      break
+    if (x, y, z) != last_controls:
+      last_controls = (x, y, z)
+      swerve.sendControls(x, y, z)
+    if models != None and models.poll():
+      swerve.setModel(models.recv())
+    swerve.step(delta_time)
+    tick += 1
+    previous = current
+    current = readState(swerve, tick*delta_time)
+    state.write(previous+current+(perf_counter(),))
+    next_time += delta_time
+    wait = next_time-perf_counter()
+    if wait > 0:
+      sleep(wait)
+    elif wait < -MAX_LAG:
+      next_time = perf_counter()
+
+class SwerveState:
+  def __init__(self, start_position = (0, 0, 0)):
+    """
+    Holds a swerve's state for display, with the same position, positions, velocities, vectors,
+    z_velocity and z_acceleration attributes as primitivePhysics.Swerve
+    """
+    self.position = list(start_position)
+    self.positions = {name: 0 for name in physics.WHEELS+physics.SWERVES}
+    self.velocities = {"frame": [0, 0]}
+    self.vectors = {"frame": FastVector(0, 0)}
+    self.z_velocity = 0
+    self.z_acceleration = 0
+    #Simulated time of the displayed state
+    self.sim_time = 0
+
+  def setState(self, state):
+    """
+    Sets every attribute from an array of the STATE fields
+    """
+    (self.sim_time, x, y, rotation, velocity_x, velocity_y, self.z_velocity, self.z_acceleration,
+     magnitude, direction, *module_positions) = state.tolist()
+    self.position[0], self.position[1], self.position[2] = x, y, rotation
+    self.velocities["frame"][0], self.velocities["frame"][1] = velocity_x, velocity_y
+    self.vectors["frame"].setPolar(magnitude, direction)
+    for name, value in zip(STATE[10:], module_positions):
+      self.positions[name] = value
+
+class RemoteSwerve(SwerveState):
+  def __init__(self, rate = DEFAULT_RATE, start_position = (0, 0, 0), model = None):
+    """
+    Stand-in for primitivePhysics.Swerve whose physics run in a child process
+    Its SwerveState attributes are filled in by update() for display
+    """
+    SwerveState.__init__(self, start_position)
+    self.model = model if model != None else physics.default_model
+    model_receiver, self.model_sender = Pipe(duplex=False)
+    self.delta_time = 1/rate
+    self.controls = SeqBlock.create(len(CONTROLS))
+    self.controls.write((0, 0, 0, 1))
+    self.state = SeqBlock.create(2*len(STATE)+1)
+    self.process = Process(target=runPhysics, name="physics", daemon=True,
+                           args=(self.controls.raw, self.state.raw, rate, tuple(start_position),
+                                 self.model, model_receiver))
+    self.process.start()
+
+  def sendControls(self, x = 0, y = 0, z = 0):
+    """
+    Passes controls to the physics process, which applies them on its next step
+    """
+    self.controls.write((x, y, z))
+
+  def setModel(self, model):
+    """
+    Sends another RobotModel to the physics process, which switches to it between two steps
+    """
+    self.model = model
+    self.model_sender.send(model)
+
+  def update(self):
+    """
+    Interpolates the displayed state between the two latest physics states
+    The display runs one physics step behind, so it never has to extrapolate
+    """
+    values = self.state.read()
+    size = len(STATE)
+    previous = values[:size]
+    current = values[size:2*size]
+    published = values[-1]
+    if current[0] == 0:
+      #Nothing has been published yet
+      return
+    alpha = min(max((perf_counter()-published)/self.delta_time, 0), 1)
+    difference = current-previous
+    for ind in WRAPPED:
+      difference[ind] = (difference[ind]+pi)%(2*pi)-pi
+    self.setState(previous+alpha*difference)
+
+  def close(self):
+    """
+    Stops the physics process
+    """
+    if self.process.is_alive():
+      self.controls.write((0,), start=CONTROLS.index("running"))
+      self.process.join(1)
@@ -4,41 +4,48 @@ pid.py: Pid loops
 """
 from time import time
 
+import numpy as np
+
 class PID:
-  def __init__(self, p, i, d, k=1):
+  def __init__(self, p, i, d, k=1, clock=time):
+    """
+    clock is only read when update is not given a delta_time
+    """
     self.p = p
     self.i = i
     self.d = d
     self.k = k
-    self.last_time = time()
+    self.clock = clock
+    self.last_time = clock()
     self.last_error = None
     self.integral = 0
 
-  def update(self, error):
-    t = time()
-    if self.last_time != None:
+  def update(self, error, delta_time=None):
+    if delta_time == None:
+      t = self.clock()
       delta_time = t-self.last_time
-    else:
-      delta_time = None
+      self.last_time = t
+    #The first update has no previous error, so it has no derivative
+    if self.last_error == None:
+      self.last_error = error
     delta_error = error-self.last_error
     p = self.getP(error)
     d = self.getD(delta_error, delta_time)
-    i = self.getI(delta_error, delta_time, d/self.d)
+    i = self.getI(delta_error, delta_time)
     self.last_error = error
-    self.last_time = t
     return (p+i+d)*self.k
 
   def getP(self, error):
     return self.p*error
 
-  def getI(self, delta_error, delta_time, derivitive):
+  def getI(self, delta_error, delta_time):
     triangle = (delta_time*delta_error)/2
     box = self.last_error*delta_time
     self.integral += triangle+box
     return self.i*self.integral
 
   def getD(self, delta_error, delta_time):
-    if delta_error != None:
+    if delta_time:
       d = self.d*(delta_error)/(delta_time)
       return d
     else:
@@ -54,3 +61,58 @@ class PID:
 
   def resetI(self):
     self.integral = 0
+
+class PIDBank:
+  def __init__(self, n, p, i, d, k=1):
+    """
+    n PID loops, updated together with the same equations as PID
+    Gains may be scalars shared by every loop, or arrays with one value per loop
+    """
+    self.n = n
+    self.p = np.broadcast_to(np.asarray(p, dtype=float), (n,)).copy()
+    self.i = np.broadcast_to(np.asarray(i, dtype=float), (n,)).copy()
+    self.d = np.broadcast_to(np.asarray(d, dtype=float), (n,)).copy()
+    self.k = np.broadcast_to(np.asarray(k, dtype=float), (n,)).copy()
+    self.last_error = np.zeros(n)
+    self.integral = np.zeros(n)
+    #Loops which have been updated since they were last reset
+    self.primed = np.zeros(n, dtype=bool)
+
+  def update(self, errors, delta_time):
+    """
+    Updates every loop with its error, over delta_time seconds, and returns their outputs
+    delta_time may be a scalar or one value per loop
+    """
+    errors = np.asarray(errors, dtype=float)
+    last_error = np.where(self.primed, self.last_error, errors)
+    delta_error = errors-last_error
+    #Trapezoidal integral, as in PID.getI
+    self.integral += (last_error+delta_error/2)*delta_time
+    delta_time = np.asarray(delta_time, dtype=float)
+    derivative = np.divide(delta_error, delta_time, out=np.zeros(self.n), where=delta_time != 0)
+    self.last_error = errors
+    self.primed[:] = True
+    return (self.p*errors+self.i*self.integral+self.d*derivative)*self.k
+
+  def tune(self, p=None, i=None, d=None, loops=None):
+    """
+    Sets gains of the given loops, an index, slice or mask, or every loop by default
+    """
+    loops = slice(None) if loops is None else loops
+    if p is not None:
+      self.p[loops] = p
+    if i is not None:
+      self.i[loops] = i
+    if d is not None:
+      self.d[loops] = d
+
+  def reset(self, loops=None):
+    """
+    Clears the integral and previous error of the given loops, or every loop by default
+    """
+    loops = slice(None) if loops is None else loops
+    self.integral[loops] = 0
+    self.primed[loops] = False
+
+  def resetI(self):
+    self.integral[:] = 0
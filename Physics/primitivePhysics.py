@@ -4,14 +4,37 @@ primitivePhysics.py: Simple version of swerve drive physics engine
 """
 
 import json
-from math import atan2, cos, pi, sin, sqrt
+import os
+from math import atan2, ceil, cos, pi, sin, sqrt
 from time import time
 
-from Physics.vectors import Vector
+from Physics.robotModel import RobotModel
+from Physics.vectors import FastVector
+
+PARAMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "params.json")
+#Component names, in the order they are updated
+WHEELS = ("frwheel", "brwheel", "flwheel", "blwheel")
+SWERVES = ("frswerve", "brswerve", "flswerve", "blswerve")
+ROLLING = ("frwheel_rolling", "brwheel_rolling", "flwheel_rolling", "blwheel_rolling")
+#Ways of integrating the frame's motion over a step
+#semi-implicit: velocities are updated first, and positions move with the new velocities
+#euler: positions move with the velocities from the start of the step
+#rk4: fourth order Runge-Kutta, re-evaluating friction within the step
+INTEGRATORS = ("semi-implicit", "euler", "rk4")
 
 
 class Swerve:
-  def __init__(self, start_position = (0, 0, 0)):
+  def __init__(self, start_position = (0, 0, 0), integrator = "semi-implicit", max_dt = None, model = None):
+    """
+    model is the RobotModel to simulate, defaulting to the one built from params.json
+    integrator is one of INTEGRATORS
+    If max_dt is given, steps longer than max_dt seconds are split into equal sub-steps no longer than it
+    """
+    if integrator not in INTEGRATORS:
+      raise ValueError("Unknown integrator: {}".format(integrator))
+    self.integrator = integrator
+    self.max_dt = max_dt
+    self.model = model if model != None else default_model
     #Position is x, y, direction
     self.position = list(start_position)
     #Swerve Wheel Target
@@ -29,30 +52,30 @@ class Swerve:
                      "flswerve": 0,
                      "blswerve": 0}
     #Vectors produced by motors or other robot-influenced forces
-    #Vectors are stored in vector objects
-    self.vectors = {"frwheel": Vector(0, 0),
-                    "brwheel": Vector(0, 0),
-                    "flwheel": Vector(0, 0),
-                    "blwheel": Vector(0, 0),
-                    "frswerve": Vector(0, 0),
-                    "brswerve": Vector(0, 0),
-                    "flswerve": Vector(0, 0),
-                    "blswerve": Vector(0, 0),
-                    "frame": Vector(0, 0)}
+    #Vectors are stored in FastVector objects, which are updated in place every tick
+    self.vectors = {"frwheel": FastVector(0, 0),
+                    "brwheel": FastVector(0, 0),
+                    "flwheel": FastVector(0, 0),
+                    "blwheel": FastVector(0, 0),
+                    "frswerve": FastVector(0, 0),
+                    "brswerve": FastVector(0, 0),
+                    "flswerve": FastVector(0, 0),
+                    "blswerve": FastVector(0, 0),
+                    "frame": FastVector(0, 0)}
     #Resistance vectors which will not accelerate the robot in the opposite direction
-    self.resistance_vectors = {"frwheel": Vector(0, 0),
-                               "brwheel": Vector(0, 0),
-                               "flwheel": Vector(0, 0),
-                               "blwheel": Vector(0, 0),
-                               "frswerve": Vector(0, 0),
-                               "brswerve": Vector(0, 0),
-                               "flswerve": Vector(0, 0),
-                               "blswerve": Vector(0, 0),
-                               "frame": Vector(0, 0)}
-    self.wheel_vectors = {"frwheel": Vector(0, 0),
-                          "brwheel": Vector(0, 0),
-                          "flwheel": Vector(0, 0),
-                          "blwheel": Vector(0, 0)}
+    self.resistance_vectors = {"frwheel": FastVector(0, 0),
+                               "brwheel": FastVector(0, 0),
+                               "flwheel": FastVector(0, 0),
+                               "blwheel": FastVector(0, 0),
+                               "frswerve": FastVector(0, 0),
+                               "brswerve": FastVector(0, 0),
+                               "flswerve": FastVector(0, 0),
+                               "blswerve": FastVector(0, 0),
+                               "frame": FastVector(0, 0)}
+    self.wheel_vectors = {"frwheel": FastVector(0, 0),
+                          "brwheel": FastVector(0, 0),
+                          "flwheel": FastVector(0, 0),
+                          "blwheel": FastVector(0, 0)}
     self.motor_velocities = {"frwheel": 0,
                              "brwheel": 0,
                              "flwheel": 0,
@@ -61,9 +84,11 @@ class Swerve:
                              "brswerve": 0,
                              "flswerve": 0,
                              "blswerve": 0}
+    #Scratch vector used to total vectors without allocating new ones
+    self.total_vector = FastVector(0, 0)
     self.z_acceleration = 0
     self.z_friction = 0
-    self.z_friction = params["rolling_friction"]
+    self.z_friction = self.model.rolling_friction
     self.z_velocity = 0
     #Diagnostic variable for z acceleration
     self.delta_z_accel = {}
@@ -81,22 +106,66 @@ class Swerve:
                        "blwheel_rolling": 0,
                        "frame": [0, 0]}
 
+  def setModel(self, model):
+    """
+    Switches to another RobotModel, which takes effect from the next step
+    """
+    self.model = model
+
   def update(self):
     """
     Calculates the effects of physics given the motor velocites and time passed
+    Time passed is measured from the wall clock, so results depend on frame rate
     """
-    #The frame's location is the only one tracked in the position variable
-    #However, it is directly affected by the other components
-    #TODO: Implement Friction
     t = time()
     delta_time = t-self.last_time
     self.last_time = t
+    self.step(delta_time)
+
+  def step(self, delta_time):
+    """
+    Advances the simulation by a fixed delta_time, in seconds, without reading the clock
+    Identical inputs and time steps always produce identical results
+    """
+    if self.max_dt and delta_time > self.max_dt:
+      n_steps = ceil(delta_time/self.max_dt)
+      for _ in range(n_steps):
+        self.integrate(delta_time/n_steps)
+    else:
+      self.integrate(delta_time)
+
+  def integrate(self, delta_time):
+    """
+    Advances the simulation by one step of delta_time with the chosen integrator
+    """
+    #The frame's location is the only one tracked in the position variable
+    #However, it is directly affected by the other components
     #Updates force vectors taking place on different parts of the robot
     self.updateVectors()
-    #Updates the velocities at which the robot/parts should be traveling
-    self.updateVelocities(delta_time)
-    #Updates the positions of the robot
-    self.updatePositions(delta_time)
+    if self.integrator == "rk4":
+      self.updateWheelVelocities(delta_time)
+      self.integrateFrameRK4(delta_time)
+      self.updateWheelPositions(delta_time)
+    elif self.integrator == "euler":
+      velocity_x, velocity_y = self.velocities["frame"]
+      z_velocity = self.z_velocity
+      self.updateVelocities(delta_time)
+      self.position[0] += velocity_x*delta_time
+      self.position[1] += velocity_y*delta_time
+      self.position[2] += z_velocity*delta_time
+      self.updateWheelPositions(delta_time)
+    else:
+      #Updates the velocities at which the robot/parts should be traveling
+      self.updateVelocities(delta_time)
+      #Updates the positions of the robot
+      self.updatePositions(delta_time)
+
+  def advance(self, n_steps, delta_time):
+    """
+    Steps the simulation n_steps times by delta_time, holding the current controls
+    """
+    for _ in range(n_steps):
+      self.step(delta_time)
 
   def updateVectors(self):
     """
@@ -114,66 +183,70 @@ class Swerve:
     """
     Updates vectors related to the wheel's drive forces
     """
-    wheels = ["frwheel", "brwheel", "flwheel", "blwheel"]
-    swerves = ["frswerve", "brswerve", "flswerve", "blswerve"]
     #TODO: This equasion does not go through rpm, but simplifies the
     #motor's mechanics into an efficency power loss
     #Velocity (m/s) = amps*volts (watts) /robot_weight (newtons)
     #= newton*meter/second*newton = meter/second
-    for ind, wheel in enumerate(wheels):
+    model = self.model
+    drive_constant = model.drive_constant
+    velocity_x, velocity_y = self.velocities["frame"]
+    for wheel, swerve in zip(WHEELS, SWERVES):
       if self.motor_velocities[wheel] <= .05:
-        self.vectors[wheel].setMagnitude(0)
-        self.vectors[wheel].setDirection(0)
+        self.vectors[wheel].setPolar(0, 0)
         continue
-      self.vectors[wheel].setMagnitude(params["voltage"]*params["max_current"]*self.motor_velocities[wheel]
-                                      *params["motor_efficency"]/params["robot_weight"])
-      self.vectors[wheel].setDirection(self.positions[swerves[ind]])
+      magnitude = drive_constant*self.motor_velocities[wheel]
+      direction = self.positions[swerve]
+      if model.tire != None:
+        #The wheel can only push as hard as its slip ratio allows
+        long_velocity = velocity_x*cos(direction)+velocity_y*sin(direction)
+        magnitude = min(magnitude, model.tractionLimit(magnitude, long_velocity))
+      self.vectors[wheel].setPolar(magnitude, direction)
 
   def updateWheelFrictionVectors(self):
     """
     Calculates rolling friction on wheels
     """
-    coef = params["rolling_friction"]
+    wheel_resistance = self.model.wheel_resistance
     for component in self.vectors:
-      self.resistance_vectors[component].setMagnitude(params["robot_weight"]/4*coef)
-      self.resistance_vectors[component].setDirection(self.vectors[component].direction+pi)
+      self.resistance_vectors[component].setPolar(wheel_resistance,
+                                                  self.vectors[component].direction+pi)
 
   def updateFrameVectors(self):
     """
     Finds the total force being applied to the frame, sans friction
     """
-    wheels = ["frwheel", "brwheel", "flwheel", "blwheel"]
-    xy_force = Vector(0, 0)
+    xy_force = self.vectors["frame"]
+    xy_force.setComponent(0, 0)
     self.z_acceleration = 0
+    angles = self.model.angles
+    torques = self.model.torques
     #Calculates the effects of vectors in the x, y, and z direction
-    for wheel in wheels:
+    for wheel in WHEELS:
       total_vector = self.vectors[wheel]#+self.resistance_vectors[wheel]
       delta_z_acceleration = total_vector.magnitude*sin(total_vector.direction-angles[wheel])*torques[wheel]
       self.delta_z_accel[wheel] = delta_z_acceleration
       self.z_acceleration += delta_z_acceleration
-      wheel_vector = Vector(total_vector.magnitude*cos(total_vector.direction-angles[wheel]), angles[wheel])
-      self.wheel_vectors[wheel] = wheel_vector
+      wheel_vector = self.wheel_vectors[wheel]
+      wheel_vector.setPolar(total_vector.magnitude*cos(total_vector.direction-angles[wheel]), angles[wheel])
       xy_force += wheel_vector
-    self.vectors["frame"] = xy_force
 
   def updateFrameFrictionVectors(self):
     """
     Finds the total friction the robot faces, based off its current velocity
     """
-    swerves = ["frswerve", "brswerve", "flswerve", "blswerve"]
     #Calculate the total force being applied to the frame
-    friction = Vector(0, 0)
+    friction = self.resistance_vectors["frame"]
+    friction.setComponent(0, 0)
+    model = self.model
     direction = atan2(self.velocities["frame"][1], self.velocities["frame"][0])-pi
-    for swerve in swerves:
-      coef = findFrictionCoef(self.positions[swerve]-self.vectors["frame"].direction)
-      magnitude = coef*params["gravity"]*params["robot_weight"]/4
-      friction += Vector(magnitude, direction)
-    self.resistance_vectors["frame"] = friction
+    for swerve in SWERVES:
+      coef = model.findFrictionCoef(self.positions[swerve]-self.vectors["frame"].direction)
+      friction.addPolarInPlace(coef*model.module_load, direction)
     #Calculate z axis friction
     if self.z_velocity > 0:
-      self.z_friction = -params["gravity"]*params["robot_weight"]*params["rolling_friction"]/2
+      self.z_friction = -model.z_friction
     elif self.z_velocity < 0:
-      self.z_friction = params["gravity"]*params["robot_weight"]*params["rolling_friction"]/2
+      self.z_friction = model.z_friction
     else:
       self.z_friction = 0
 
@@ -194,15 +267,16 @@ class Swerve:
     self.velocityUnitTest(delta_time)
 
   def updateWheelVelocities(self, delta_time):
-    wheels = ["frwheel", "brwheel", "flwheel", "blwheel"]
-    for wheel in wheels:
-      vector = self.vectors[wheel]+self.resistance_vectors[wheel]
+    vector = self.total_vector
+    for wheel, rolling in zip(WHEELS, ROLLING):
+      vector.set(self.vectors[wheel])
+      vector += self.resistance_vectors[wheel]
       delta_x = vector.magnitude*delta_time*cos(self.vectors[wheel].direction)
       delta_y = vector.magnitude*delta_time*sin(self.vectors[wheel].direction)
       self.velocities[wheel][0] += delta_x
       self.velocities[wheel][1] += delta_y
       #TODO: This is not derived from real physics
-      self.velocities["{}_rolling".format(wheel)] = (-self.motor_velocities[wheel]-(self.velocities["frame"][0]**2+self.velocities["frame"][1]**2))*.4
+      self.velocities[rolling] = (-self.motor_velocities[wheel]-(self.velocities["frame"][0]**2+self.velocities["frame"][1]**2))*.4
       if self.vectors[wheel].magnitude < self.resistance_vectors[wheel].magnitude:
         if ((delta_x > 0 and self.velocities[wheel][0] > 0)
            or (delta_x < 0 and self.velocities[wheel][0] < 0)):
@@ -212,9 +286,11 @@ class Swerve:
           self.velocities[wheel][1] = 0
 
   def updateFrameVelocity(self, delta_time):
-    total_vector = self.vectors["frame"]+self.resistance_vectors["frame"]
-    delta_x = total_vector.magnitude*cos(total_vector.direction)*delta_time
-    delta_y = total_vector.magnitude*sin(total_vector.direction)*delta_time
+    total_vector = self.total_vector
+    total_vector.set(self.vectors["frame"])
+    total_vector += self.resistance_vectors["frame"]
+    delta_x = total_vector.x*delta_time
+    delta_y = total_vector.y*delta_time
     #TODO: Update this to be based off accurate friction measurements
     delta_z = (self.z_acceleration+self.z_friction)*delta_time
     self.velocities["frame"][0] += delta_x
@@ -232,6 +308,48 @@ class Swerve:
         self.z_velocity = 0
     #print("z_velocity: {}\nz_acceleration: {}\nz_friction: {}\ndelta_z: {}".format(self.z_velocity, self.z_acceleration, self.z_friction, delta_z))
 
+  def integrateFrameRK4(self, delta_time):
+    """
+    Integrates the frame's velocity and position with fourth order Runge-Kutta
+    Drive forces are held for the step, while friction follows the velocity within it
+    The same clamping as updateFrameVelocity keeps friction from reversing the robot
+    """
+    force = self.vectors["frame"]
+    force_x, force_y = force.x, force.y
+    friction = self.resistance_vectors["frame"].magnitude
+    z_acceleration = self.z_acceleration
+    z_friction = self.model.z_friction
+    def accelerations(velocity_x, velocity_y, z_velocity):
+      direction = atan2(velocity_y, velocity_x)-pi
+      if z_velocity > 0:
+        z_total = z_acceleration-z_friction
+      elif z_velocity < 0:
+        z_total = z_acceleration+z_friction
+      else:
+        z_total = z_acceleration
+      return (force_x+friction*cos(direction), force_y+friction*sin(direction), z_total)
+    start = (self.velocities["frame"][0], self.velocities["frame"][1], self.z_velocity)
+    k1 = accelerations(*start)
+    v2 = tuple(v+delta_time/2*a for v, a in zip(start, k1))
+    k2 = accelerations(*v2)
+    v3 = tuple(v+delta_time/2*a for v, a in zip(start, k2))
+    k3 = accelerations(*v3)
+    v4 = tuple(v+delta_time*a for v, a in zip(start, k3))
+    k4 = accelerations(*v4)
+    #Positions integrate the velocity at each stage, so they use the same weights
+    for ind in range(3):
+      self.position[ind] += delta_time/6*(start[ind]+2*v2[ind]+2*v3[ind]+v4[ind])
+    deltas = [delta_time/6*(k1[ind]+2*k2[ind]+2*k3[ind]+k4[ind]) for ind in range(3)]
+    velocity = [start[ind]+deltas[ind] for ind in range(3)]
+    if force.magnitude < friction:
+      for ind in range(2):
+        if (deltas[ind] > 0 and velocity[ind] > 0) or (deltas[ind] < 0 and velocity[ind] < 0):
+          velocity[ind] = 0
+    if abs(z_acceleration) < abs(self.z_friction):
+      if (self.z_friction > 0 and velocity[2] > 0) or (self.z_friction < 0 and velocity[2] < 0):
+        velocity[2] = 0
+    self.velocities["frame"][0], self.velocities["frame"][1], self.z_velocity = velocity
+
   def velocityUnitTest(self, delta_time):
     """
     Checks if velocity calculations are working
@@ -290,52 +408,31 @@ class Swerve:
     self.positions["flswerve"] = direction
     self.positions["blswerve"] = direction
 
-def loadParams():
-  f = open("Physics/params.json")
+def loadParams(path = PARAMS_PATH):
+  f = open(path)
   params = json.load(f)
   f.close()
   return params
 
 def findFrictionCoef(angle):
   """
-  Finds the coefficent of friction the robot's wheels will encounter based on the angle at which they are being dragged
+  Finds the coefficent of friction for the default model, see RobotModel.findFrictionCoef
+  """
+  return default_model.findFrictionCoef(angle)
+
+def setParams(new_params):
+  """
+  Replaces the default parameters and rebuilds the default model from them
+  Swerves already created keep the model they were given
   """
-  #TODO: Find correct model for this measurement
-  #angle is the angle between the dragging force and wheel direction
-  #pi/2 radians = straight
-  #How far the angle is from being straight
-  # offset = abs((pi/2)-(angle%pi))/(pi/2)
-  # #Difference between the rolling and skiding wheel coefficents
-  # diff_of_coef = params["wheel_skid_friction"]-params["rolling_friction"]
-  # coef = params["rolling_friction"]+(diff_of_coef*offset)
-  return params["rolling_friction"]
+  global torques, angles, default_model
+  params.clear()
+  params.update(new_params)
+  default_model = RobotModel(params)
+  torques, angles = default_model.torques, default_model.angles
 
 
 params = loadParams()
-#Wheel distances from robot center of gravity
-#Used for calculating robot spin
-#TODO: Fix these distance formulas
-torques = {"frwheel": (sqrt((params["wheel_offset_x"]/2-params["cgoffset_x"])**2
-                       + (params["wheel_offset_y"]/2-params["cgoffset_y"])**2)),
-           "brwheel": (sqrt((params["wheel_offset_x"]/2-params["cgoffset_x"])**2
-                       + (params["wheel_offset_y"]/2+params["cgoffset_y"])**2)),
-           "flwheel": (-sqrt((params["wheel_offset_x"]/2+params["cgoffset_x"])**2
-                       + (params["wheel_offset_y"]/2-params["cgoffset_y"])**2)),
-           "blwheel": (-sqrt((params["wheel_offset_x"]/2+params["cgoffset_x"])**2
-                       + (params["wheel_offset_y"]/2+params["cgoffset_y"])**2))}
-#Cartesian distances from center of gravity
-frdist = (params["wheel_offset_x"]/2-params["cgoffset_x"],
-          params["wheel_offset_y"]/2-params["cgoffset_y"])
-brdist = (params["wheel_offset_x"]/2-params["cgoffset_x"],
-          -(params["wheel_offset_y"]/2+params["cgoffset_y"]))
-fldist = (-(params["wheel_offset_x"]/2+params["cgoffset_x"]),
-          params["wheel_offset_y"]/2-params["cgoffset_y"])
-bldist = (-(params["wheel_offset_x"]/2+params["cgoffset_x"]),
-          -(params["wheel_offset_y"]/2+params["cgoffset_y"]))
-#Angles of the lines propigated between the center of gravity and wheel locations
-#Angles should be the same between diagonally aligned wheels
-#since their forces both should be transposed on the same vectors
-angles = {"frwheel": atan2(frdist[1], frdist[0]),
-          "brwheel": atan2(fldist[1], fldist[0]),
-          "flwheel": atan2(fldist[1], fldist[0]),
-          "blwheel": atan2(frdist[1], frdist[0])}
+default_model = RobotModel(params)
+#Geometry of the default model, kept for code which reads it from this module
+torques, angles = default_model.torques, default_model.angles
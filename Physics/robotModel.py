@@ -0,0 +1,96 @@
+"""
+robotModel.py: Robot constants compiled from a physics parameter set
+Every value the physics engines need on each tick is derived here once, so
+robots with different parameters can share one process
+"""
+
+from math import atan2, pi, sqrt
+
+from Physics.tireModel import TireModel
+
+#Wheel names, in the order used by the tuples below
+WHEELS = ("frwheel", "brwheel", "flwheel", "blwheel")
+
+
+class RobotModel:
+  def __init__(self, params, name = "default"):
+    """
+    Compiles a dict of physics parameters, like those in params.json
+    Models are not changed after they are built, so one can be shared by many robots
+    """
+    self.name = name
+    self.params = dict(params)
+    self.robot_weight = params["robot_weight"]
+    self.gravity = params["gravity"]
+    self.rolling_friction = params["rolling_friction"]
+    #Drive vector magnitude per unit of motor velocity
+    #Velocity (m/s) = amps*volts (watts) /robot_weight (newtons)
+    self.drive_constant = params["voltage"]*params["max_current"]*params["motor_efficency"]/params["robot_weight"]
+    #Rolling resistance of each wheel
+    self.wheel_resistance = params["robot_weight"]/4*params["rolling_friction"]
+    #Weight carried by each module, which friction coefficients are multiplied by
+    self.module_load = params["gravity"]*params["robot_weight"]/4
+    #Friction against rotating the frame
+    self.z_friction = params["gravity"]*params["robot_weight"]*params["rolling_friction"]/2
+    self.torques, self.angles = calculateGeometry(params)
+    #The same tables as tuples in WHEELS order, for the vectorized engine
+    self.torque_list = tuple(self.torques[wheel] for wheel in WHEELS)
+    self.angle_list = tuple(self.angles[wheel] for wheel in WHEELS)
+    #Tabulated slip and skid curves, only used when the tire_model parameter is set
+    self.tire = TireModel.fromParams(params) if params.get("tire_model") else None
+    #Steering loop gains, and the fastest the swerve modules turn in radians per second
+    self.swerve_gains = (params["swerve_p"], params["swerve_i"], params["swerve_d"])
+    self.swerve_speed = params["rpm_swerve"]*2*pi/60
+
+  def findFrictionCoef(self, angle):
+    """
+    Finds the coefficent of friction the robot's wheels will encounter based on the angle at which they are being dragged
+    angle is the angle between the dragging force and wheel direction, 0 when rolling straight
+    Without the tire model, wheels always face rolling friction
+    """
+    if self.tire == None:
+      return self.rolling_friction
+    return self.tire.skidCoef(angle)
+
+  def tractionLimit(self, wheel_speed, long_velocity):
+    """
+    Largest drive force a wheel can put down through the tire model
+    wheel_speed is the speed the motor turns the wheel's surface at, long_velocity the
+    ground speed along the wheel
+    """
+    slip_ratio = self.tire.slipRatio(wheel_speed, long_velocity)
+    return max(self.tire.slipForce(slip_ratio)*self.module_load, 0)
+
+def calculateGeometry(params):
+  """
+  Calculates the wheel torque arms and angles from the robot's dimensions
+  Returns a (torques, angles) pair of dicts keyed by wheel
+  """
+  #Wheel distances from robot center of gravity
+  #Used for calculating robot spin
+  #TODO: Fix these distance formulas
+  torques = {"frwheel": (sqrt((params["wheel_offset_x"]/2-params["cgoffset_x"])**2
+                         + (params["wheel_offset_y"]/2-params["cgoffset_y"])**2)),
+             "brwheel": (sqrt((params["wheel_offset_x"]/2-params["cgoffset_x"])**2
+                         + (params["wheel_offset_y"]/2+params["cgoffset_y"])**2)),
+             "flwheel": (-sqrt((params["wheel_offset_x"]/2+params["cgoffset_x"])**2
+                         + (params["wheel_offset_y"]/2-params["cgoffset_y"])**2)),
+             "blwheel": (-sqrt((params["wheel_offset_x"]/2+params["cgoffset_x"])**2
+                         + (params["wheel_offset_y"]/2+params["cgoffset_y"])**2))}
+  #Cartesian distances from center of gravity
+  frdist = (params["wheel_offset_x"]/2-params["cgoffset_x"],
+            params["wheel_offset_y"]/2-params["cgoffset_y"])
+  brdist = (params["wheel_offset_x"]/2-params["cgoffset_x"],
+            -(params["wheel_offset_y"]/2+params["cgoffset_y"]))
+  fldist = (-(params["wheel_offset_x"]/2+params["cgoffset_x"]),
+            params["wheel_offset_y"]/2-params["cgoffset_y"])
+  bldist = (-(params["wheel_offset_x"]/2+params["cgoffset_x"]),
+            -(params["wheel_offset_y"]/2+params["cgoffset_y"]))
+  #Angles of the lines propigated between the center of gravity and wheel locations
+  #Angles should be the same between diagonally aligned wheels
+  #since their forces both should be transposed on the same vectors
+  angles = {"frwheel": atan2(frdist[1], frdist[0]),
+            "brwheel": atan2(fldist[1], fldist[0]),
+            "flwheel": atan2(fldist[1], fldist[0]),
+            "blwheel": atan2(frdist[1], frdist[0])}
+  return torques, angles
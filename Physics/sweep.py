@@ -0,0 +1,131 @@
+"""
+sweep.py: Monte Carlo parameter sweeps of headless swerve simulations across a process pool
+Run from the repository root, for example:
+  python -m Physics.sweep --param robot_weight=5:9 --param rolling_friction=.05:.2 --samples 500
+"""
+
+import argparse
+import csv
+import os
+import random
+from math import sqrt
+from multiprocessing import Pool
+
+import Physics.headless as headless
+import Physics.manageParams as manageParams
+import Physics.primitivePhysics as physics
+from Physics.robotModel import RobotModel
+
+#Drives forward at full speed, then releases the controls and coasts
+DEFAULT_TRACE = [(3, 0, 1, 0), (3, 0, 0, 0)]
+
+
+def parseRanges(specs):
+  """
+  Parses "name=low:high" or "name=value" strings into a dict of (low, high) ranges
+  """
+  ranges = {}
+  for spec in specs:
+    name, _, value = spec.partition("=")
+    if name not in physics.params:
+      raise ValueError("Unknown physics parameter: {}".format(name))
+    if ":" in value:
+      low, high = value.split(":")
+    else:
+      low = high = value
+    ranges[name] = (float(low), float(high))
+  return ranges
+
+def drawSamples(ranges, num_samples, seed):
+  """
+  Draws uniformly distributed parameter sets from the ranges
+  The same seed always produces the same samples
+  """
+  rng = random.Random(seed)
+  samples = []
+  for _ in range(num_samples):
+    samples.append({name: rng.uniform(low, high) for name, (low, high) in ranges.items()})
+  return samples
+
+def simulateSample(job):
+  """
+  Runs one headless simulation of the trace with the sample's parameters
+  """
+  index, base_params, sample, trace, delta_time, tolerance, integrator, max_dt = job
+  model = RobotModel(dict(base_params, **sample))
+  swerve = physics.Swerve(integrator=integrator, max_dt=max_dt, model=model)
+  speeds = []
+  headless.runTrace(swerve, trace, delta_time,
+                    callback=lambda tick, swerve: speeds.append(sqrt(swerve.velocities["frame"][0]**2
+                                                                     + swerve.velocities["frame"][1]**2)))
+  result = {"sample": index}
+  result.update(sample)
+  result["final_x"], result["final_y"], result["final_rotation"] = swerve.position
+  result["peak_velocity"] = max(speeds, default=0)
+  result["settling_time"] = findSettlingTime(speeds, trace, delta_time, tolerance)
+  return result
+
+def findSettlingTime(speeds, trace, delta_time, tolerance):
+  """
+  Finds how long after the start of the trace's last segment the speed stays within
+  tolerance (a fraction of the peak speed) of its final value
+  """
+  if not speeds:
+    return 0
+  last_segment_start = sum(round(segment[0]/delta_time) for segment in trace[:-1])
+  band = tolerance*max(max(speeds), 1e-9)
+  final = speeds[-1]
+  settled = len(speeds)
+  for tick in range(len(speeds)-1, last_segment_start-1, -1):
+    if abs(speeds[tick]-final) > band:
+      break
+    settled = tick
+  return (settled-last_segment_start)*delta_time
+
+def runSweep(ranges, num_samples, trace = DEFAULT_TRACE, delta_time = headless.DEFAULT_DT,
+             seed = 0, tolerance = .02, workers = None, integrator = "semi-implicit", max_dt = None,
+             base_params = None):
+  """
+  Runs num_samples simulations across a pool of worker processes, one per core by default
+  Samples are laid over base_params, which default to the current physics parameters
+  Returns one result dict per sample, in sample order
+  """
+  samples = drawSamples(ranges, num_samples, seed)
+  base_params = dict(base_params or physics.params)
+  jobs = [(index, base_params, sample, trace, delta_time, tolerance, integrator, max_dt)
+          for index, sample in enumerate(samples)]
+  workers = workers or os.cpu_count()
+  with Pool(workers) as pool:
+    return pool.map(simulateSample, jobs, chunksize=max(1, len(jobs)//(workers*4)))
+
+def writeResults(results, path):
+  with open(path, "w", newline="") as f:
+    writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+    writer.writeheader()
+    writer.writerows(results)
+
+def main():
+  parser = argparse.ArgumentParser(description="Monte Carlo sweep of physics parameters over headless simulations")
+  parser.add_argument("--param", action="append", default=[], metavar="NAME=LOW:HIGH",
+                      help="parameter range to sample; may be repeated")
+  parser.add_argument("--samples", type=int, default=100)
+  parser.add_argument("--trace", help="csv file of 'seconds, x, y, z' control segments")
+  parser.add_argument("--dt", type=float, default=headless.DEFAULT_DT, help="fixed timestep in seconds")
+  parser.add_argument("--integrator", choices=physics.INTEGRATORS, default="semi-implicit")
+  parser.add_argument("--max-dt", type=float, default=None, help="split steps longer than this into sub-steps")
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--tolerance", type=float, default=.02, help="settling band as a fraction of peak speed")
+  parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to one per core")
+  parser.add_argument("--out", default="sweep_results.csv")
+  parser.add_argument("--profile", default=manageParams.DEFAULT_PROFILE, choices=manageParams.listProfiles(),
+                      help="physics parameter profile from Physics/profiles which the samples are laid over")
+  args = parser.parse_args()
+  trace = headless.loadTrace(args.trace) if args.trace else DEFAULT_TRACE
+  results = runSweep(parseRanges(args.param), args.samples, trace, args.dt,
+                     args.seed, args.tolerance, args.workers, args.integrator, args.max_dt,
+                     manageParams.loadProfile(args.profile))
+  writeResults(results, args.out)
+  print("Wrote {} samples to {}".format(len(results), args.out))
+
+if __name__ == "__main__":
+  main()
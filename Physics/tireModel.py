@@ -0,0 +1,114 @@
+"""
+tireModel.py: Tabulated tire model, for the slip ratio and wheel skid parts of docs/PHYSICS.md
+Curves are sampled once into evenly spaced tables, so a lookup is a linear interpolation
+The scalar lookups serve primitivePhysics.Swerve, the array lookups serve batchPhysics.BatchSwerve
+"""
+
+from math import atan, pi, sin
+
+import numpy as np
+
+#Points sampled from each curve
+TABLE_SIZE = 256
+#Slip ratios covered by the slip table, larger slips use the value at the end of the table
+MAX_SLIP = 1
+#Shape of the slip ratio to longitudinal force curve, in the form of the Pacejka magic formula
+#sin(shape*atan(stiffness*slip)), which peaks at a slip ratio of about .15
+SLIP_STIFFNESS = 10
+SLIP_SHAPE = 1.9
+#Shape of the skid angle to friction coefficent curve, which rises quickly and levels off
+SKID_STIFFNESS = 8
+SKID_SHAPE = 1.3
+
+
+def magicFormula(x, stiffness, shape):
+  return np.sin(shape*np.arctan(stiffness*x))
+
+class TireModel:
+  def __init__(self, slip_ratios, slip_forces, skid_angles, skid_coefs):
+    """
+    Builds a tire model from sampled curves
+    slip_forces are longitudinal force per unit of wheel load at each of slip_ratios
+    skid_coefs are friction coefficents at each of skid_angles, which run from 0 (rolling straight)
+    to pi/2 (dragged sideways)
+    Both sets of samples must be evenly spaced and in increasing order
+    """
+    self.slip_ratios = np.asarray(slip_ratios, dtype=float)
+    self.slip_forces = np.asarray(slip_forces, dtype=float)
+    self.skid_angles = np.asarray(skid_angles, dtype=float)
+    self.skid_coefs = np.asarray(skid_coefs, dtype=float)
+    #Plain lists and floats for the scalar lookups, which are faster than indexing arrays
+    self.slip_list = self.slip_forces.tolist()
+    self.slip_start = float(self.slip_ratios[0])
+    self.slip_end = float(self.slip_ratios[-1])
+    self.slip_scale = (len(self.slip_list)-1)/(self.slip_end-self.slip_start)
+    self.skid_list = self.skid_coefs.tolist()
+    self.skid_start = float(self.skid_angles[0])
+    self.skid_end = float(self.skid_angles[-1])
+    self.skid_scale = (len(self.skid_list)-1)/(self.skid_end-self.skid_start)
+
+  @classmethod
+  def fromParams(cls, params, size = TABLE_SIZE):
+    """
+    Samples the default curves, scaled by the robot's friction coefficents
+    Traction peaks at wheel_skid_friction, skidding ranges from rolling_friction to wheel_skid_friction
+    """
+    slip_ratios = np.linspace(-MAX_SLIP, MAX_SLIP, size)
+    slip_forces = params["wheel_skid_friction"]*magicFormula(slip_ratios, SLIP_STIFFNESS, SLIP_SHAPE)
+    skid_angles = np.linspace(0, pi/2, size)
+    shape = magicFormula(skid_angles, SKID_STIFFNESS, SKID_SHAPE)/sin(SKID_SHAPE*atan(SKID_STIFFNESS*pi/2))
+    skid_coefs = params["rolling_friction"]+(params["wheel_skid_friction"]-params["rolling_friction"])*shape
+    return cls(slip_ratios, slip_forces, skid_angles, skid_coefs)
+
+  def slipRatio(self, wheel_speed, long_velocity):
+    """
+    Slip ratio of a wheel whose surface moves at wheel_speed over ground moving at long_velocity
+    along the wheel. With no ground speed the slip is effectively infinite, so the table's end is used
+    """
+    if long_velocity == 0:
+      if wheel_speed == 0:
+        return 0
+      return self.slip_end if wheel_speed > 0 else self.slip_start
+    return (wheel_speed-long_velocity)/abs(long_velocity)
+
+  def slipRatios(self, wheel_speeds, long_velocities):
+    """
+    Array version of slipRatio
+    """
+    speed = np.abs(long_velocities)
+    stopped = speed == 0
+    ratios = (wheel_speeds-long_velocities)/np.where(stopped, 1, speed)
+    return np.where(stopped, np.sign(wheel_speeds)*self.slip_end, ratios)
+
+  def slipForce(self, slip_ratio):
+    """
+    Longitudinal force per unit of wheel load at a slip ratio
+    """
+    position = (slip_ratio-self.slip_start)*self.slip_scale
+    if position <= 0:
+      return self.slip_list[0]
+    ind = int(position)
+    if ind >= len(self.slip_list)-1:
+      return self.slip_list[-1]
+    low = self.slip_list[ind]
+    return low+(self.slip_list[ind+1]-low)*(position-ind)
+
+  def slipForces(self, slip_ratios):
+    return np.interp(slip_ratios, self.slip_ratios, self.slip_forces)
+
+  def skidCoef(self, angle):
+    """
+    Friction coefficent of a wheel dragged at angle radians from its rolling direction
+    The angle is folded into 0 to pi/2, since dragging a wheel backwards or to either side is the same
+    """
+    position = (abs((angle+pi/2)%pi-pi/2)-self.skid_start)*self.skid_scale
+    if position <= 0:
+      return self.skid_list[0]
+    ind = int(position)
+    if ind >= len(self.skid_list)-1:
+      return self.skid_list[-1]
+    low = self.skid_list[ind]
+    return low+(self.skid_list[ind+1]-low)*(position-ind)
+
+  def skidCoefs(self, angles):
+    return np.interp(np.abs((angles+pi/2)%pi-pi/2), self.skid_angles, self.skid_coefs)
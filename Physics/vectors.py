@@ -39,3 +39,142 @@ class Vector:
     component = (self.component[0]-vector.component[0],
                  self.component[1]-vector.component[1])
     return Vector(component=component)
+
+class FastVector:
+  """
+  Mutable 2D vector for the physics hot loop
+  Stores both cartesian and polar forms, and only converts between them when the stale form is read
+  Operations ending in InPlace, and the += and -= operators, modify the vector instead of allocating a new one
+  """
+  __slots__ = ("_x", "_y", "_magnitude", "_direction", "_cartesian", "_polar")
+
+  def __init__(self, magnitude = None, direction = None, component = None):
+    self._x = self._y = self._magnitude = self._direction = 0
+    if component != None:
+      self.setComponent(component[0], component[1])
+    elif magnitude != None and direction != None:
+      self.setPolar(magnitude, direction)
+    else:
+      raise TypeError("Insufficent Arguments Provided")
+
+  @property
+  def x(self):
+    if not self._cartesian:
+      self.updateComponent()
+    return self._x
+
+  @property
+  def y(self):
+    if not self._cartesian:
+      self.updateComponent()
+    return self._y
+
+  @property
+  def component(self):
+    if not self._cartesian:
+      self.updateComponent()
+    return self._x, self._y
+
+  @property
+  def magnitude(self):
+    if not self._polar:
+      self.updatePolar()
+    return self._magnitude
+
+  @property
+  def direction(self):
+    if not self._polar:
+      self.updatePolar()
+    return self._direction
+
+  def setComponent(self, x, y):
+    self._x = x
+    self._y = y
+    self._cartesian = True
+    self._polar = False
+
+  def setPolar(self, magnitude, direction):
+    self._magnitude = magnitude
+    self._direction = direction
+    self._polar = True
+    self._cartesian = False
+
+  def setMagnitude(self, magnitude):
+    if not self._polar:
+      self.updatePolar()
+    self._magnitude = magnitude
+    self._cartesian = False
+
+  def setDirection(self, direction):
+    if not self._polar:
+      self.updatePolar()
+    self._direction = direction
+    self._cartesian = False
+
+  def set(self, vector):
+    """
+    Copies the value of another FastVector into this one
+    """
+    self._x, self._y, self._cartesian = vector._x, vector._y, vector._cartesian
+    self._magnitude, self._direction, self._polar = vector._magnitude, vector._direction, vector._polar
+
+  def updateComponent(self):
+    self._x = self._magnitude*cos(self._direction)
+    self._y = self._magnitude*sin(self._direction)
+    self._cartesian = True
+
+  def updatePolar(self):
+    self._magnitude = sqrt(self._x**2 + self._y**2)
+    self._direction = atan2(self._y, self._x)
+    self._polar = True
+
+  def addInPlace(self, vector):
+    if not self._cartesian:
+      self.updateComponent()
+    if not vector._cartesian:
+      vector.updateComponent()
+    self._x += vector._x
+    self._y += vector._y
+    self._polar = False
+    return self
+
+  def subInPlace(self, vector):
+    if not self._cartesian:
+      self.updateComponent()
+    if not vector._cartesian:
+      vector.updateComponent()
+    self._x -= vector._x
+    self._y -= vector._y
+    self._polar = False
+    return self
+
+  def addPolarInPlace(self, magnitude, direction):
+    """
+    Adds a vector given in polar form without constructing it
+    """
+    if not self._cartesian:
+      self.updateComponent()
+    self._x += magnitude*cos(direction)
+    self._y += magnitude*sin(direction)
+    self._polar = False
+    return self
+
+  def scaleInPlace(self, factor):
+    if self._cartesian:
+      self._x *= factor
+      self._y *= factor
+    if self._polar:
+      self._magnitude *= factor
+    return self
+
+  def __iadd__(self, vector):
+    return self.addInPlace(vector)
+
+  def __isub__(self, vector):
+    return self.subInPlace(vector)
+
+  def __add__(self, vector):
+    return FastVector(component=(self.x+vector.x, self.y+vector.y))
+
+  def __sub__(self, vector):
+    return FastVector(component=(self.x-vector.x, self.y-vector.y))
@@ -0,0 +1,75 @@
+"""
+keyframes.py: Constant time seeking in recorded telemetry sessions
+Every tick of a session holds the full swerve state, so any time can be shown without
+re-running physics. A keyframe index of evenly spaced times points at the tick recorded
+at or before each one, so a seek jumps to the nearest keyframe and only steps over the few
+ticks after it. Columns stay memory mapped, and only the two ticks around a time are read
+"""
+
+from math import pi
+
+import numpy as np
+
+from Telemetry.recorder import COLUMNS
+
+#Columns which make up the swerve state, in the order of physicsProcess.STATE
+STATE_COLUMNS = COLUMNS[:COLUMNS.index("blwheel")+1]
+#Columns which are angles that wrap around, and should be interpolated the short way
+WRAPPED_COLUMNS = ("frame_direction", "frswerve", "brswerve", "flswerve", "blswerve")
+DEFAULT_TICKS_PER_KEY = 64
+
+
+class KeyframeIndex:
+  def __init__(self, columns, ticks_per_key = DEFAULT_TICKS_PER_KEY, fields = STATE_COLUMNS):
+    """
+    Indexes a session loaded with recorder.loadSession, with keyframes about ticks_per_key ticks apart
+    """
+    self.times = columns["time"]
+    self.rows = len(self.times)
+    if self.rows == 0:
+      raise ValueError("The session has no recorded ticks")
+    self.columns = [columns[field] for field in fields]
+    self.wrapped = [ind for ind, field in enumerate(fields) if field in WRAPPED_COLUMNS]
+    self.start = float(self.times[0])
+    self.end = float(self.times[-1])
+    #Keyframes are evenly spaced in time, so finding one is a division
+    span = self.end-self.start
+    self.interval = span/max(self.rows-1, 1)*ticks_per_key or 1
+    key_times = self.start+np.arange(int(span/self.interval)+1)*self.interval
+    #Last tick recorded at or before each keyframe
+    self.key_ticks = (np.searchsorted(self.times, key_times, side="right")-1).tolist()
+
+  def duration(self):
+    return self.end-self.start
+
+  def clamp(self, t):
+    return min(max(t, self.start), self.end)
+
+  def tickAt(self, t):
+    """
+    Returns the last tick recorded at or before t seconds
+    """
+    t = self.clamp(t)
+    tick = self.key_ticks[min(int((t-self.start)/self.interval), len(self.key_ticks)-1)]
+    times = self.times
+    while tick+1 < self.rows and times[tick+1] <= t:
+      tick += 1
+    return tick
+
+  def stateAt(self, t):
+    """
+    Returns the state at t seconds as an array of the indexed fields,
+    interpolated between the ticks recorded before and after it
+    """
+    t = self.clamp(t)
+    tick = self.tickAt(t)
+    if tick+1 >= self.rows:
+      return np.array([column[tick] for column in self.columns])
+    pair = np.array([column[tick:tick+2] for column in self.columns])
+    before, after = pair[:, 0], pair[:, 1]
+    t0, t1 = float(self.times[tick]), float(self.times[tick+1])
+    alpha = (t-t0)/(t1-t0) if t1 > t0 else 0
+    difference = after-before
+    for ind in self.wrapped:
+      difference[ind] = (difference[ind]+pi)%(2*pi)-pi
+    return before+alpha*difference
@@ -0,0 +1,165 @@
+"""
+profiler.py: Per-task frame timing, without PStats
+Each task added through a TaskProfiler is timed on every call, and the timings
+are kept in a fixed-size ring per task. The render thread is the only writer, so
+no locks are taken and nothing is allocated per call
+Timings can be summarized as percentiles, shown in the Overlay slots, or
+exported as a Chrome trace (chrome://tracing or https://ui.perfetto.dev)
+"""
+
+import json
+import os
+from time import perf_counter
+
+import numpy as np
+
+#Name of the pseudo-task which times whole frames
+FRAME = "frame"
+#Seconds between refreshes of the overlay text
+OVERLAY_INTERVAL = .5
+#Overlay slots used for the summary, overlay.Overlay has six
+OVERLAY_SLOTS = 6
+
+
+class TimingRing:
+  def __init__(self, size):
+    """
+    Holds the start times and durations of the last size calls, in seconds
+    """
+    self.starts = np.zeros(size)
+    self.durations = np.zeros(size)
+    self.size = size
+    #Total calls recorded, the next write goes to count % size
+    self.count = 0
+
+  def record(self, start, duration):
+    ind = self.count % self.size
+    self.starts[ind] = start
+    self.durations[ind] = duration
+    self.count += 1
+
+  def filled(self):
+    """
+    Returns the recorded (starts, durations), oldest first
+    """
+    if self.count <= self.size:
+      return self.starts[:self.count], self.durations[:self.count]
+    ind = self.count % self.size
+    return (np.concatenate((self.starts[ind:], self.starts[:ind])),
+            np.concatenate((self.durations[ind:], self.durations[:ind])))
+
+class TaskProfiler:
+  def __init__(self, size = 2048):
+    """
+    Keeps the last size timings of every profiled task
+    """
+    self.size = size
+    self.rings = {}
+    self.overlay = None
+    self.overlay_time = 0
+    self.last_frame = None
+
+  def ring(self, name):
+    if name not in self.rings:
+      self.rings[name] = TimingRing(self.size)
+    return self.rings[name]
+
+  def wrap(self, func, name):
+    """
+    Returns a task function which calls func and records how long it took
+    """
+    ring = self.ring(name)
+    def profiled(task):
+      start = perf_counter()
+      result = func(task)
+      ring.record(start, perf_counter()-start)
+      return result
+    return profiled
+
+  def addTask(self, task_mgr, func, name, **kwargs):
+    """
+    Drop-in for task_mgr.add(func, name) which profiles the task
+    """
+    return task_mgr.add(self.wrap(func, name), name, **kwargs)
+
+  def start(self, task_mgr):
+    """
+    Adds the task which times whole frames and refreshes the overlay
+    It runs before every other task, so each frame is timed from one of its calls to the next
+    """
+    task_mgr.add(self.frameTask, "profileFrame", sort=-1000)
+
+  def frameTask(self, task):
+    now = perf_counter()
+    if self.last_frame != None:
+      self.ring(FRAME).record(self.last_frame, now-self.last_frame)
+    self.last_frame = now
+    if self.overlay != None and now-self.overlay_time >= OVERLAY_INTERVAL:
+      self.overlay_time = now
+      self.updateOverlay()
+    return task.cont
+
+  def percentiles(self, name, percents = (50, 99)):
+    """
+    Returns the given percentiles of a task's recorded durations, in milliseconds
+    """
+    _, durations = self.ring(name).filled()
+    if len(durations) == 0:
+      return [0 for _ in percents]
+    return list(np.percentile(durations, percents)*1000)
+
+  def summary(self):
+    """
+    Returns one "name  p50  p99" line per task, frame first
+    """
+    lines = []
+    for name in sorted(self.rings, key=lambda name: name != FRAME):
+      p50, p99 = self.percentiles(name)
+      lines.append("{}  p50 {:.2f}  p99 {:.2f} ms".format(name, p50, p99))
+    return lines
+
+  def toggleOverlay(self, overlay):
+    """
+    Starts or stops showing the summary in the slots of overlay, an overlay.Overlay
+    """
+    if self.overlay == None:
+      self.overlay = overlay
+      self.updateOverlay()
+    else:
+      self.clearOverlay()
+      self.overlay = None
+
+  def updateOverlay(self):
+    lines = self.summary()
+    #Tasks which do not fit are counted in the last slot
+    if len(lines) > OVERLAY_SLOTS:
+      lines = lines[:OVERLAY_SLOTS-1]+["+{} more tasks".format(len(lines)-OVERLAY_SLOTS+1)]
+    for slot in range(OVERLAY_SLOTS):
+      self.overlay.setText(slot, lines[slot] if slot < len(lines) else "")
+
+  def clearOverlay(self):
+    for slot in range(OVERLAY_SLOTS):
+      self.overlay.setText(slot, "")
+
+  def traceEvents(self):
+    """
+    Returns the recorded timings as Chrome trace complete events, one thread per task
+    """
+    events = []
+    for tid, name in enumerate(self.rings):
+      starts, durations = self.rings[name].filled()
+      events.append({"name": "thread_name", "ph": "M", "pid": 0, "tid": tid, "args": {"name": name}})
+      for start, duration in zip((starts*1e6).tolist(), (durations*1e6).tolist()):
+        events.append({"name": name, "ph": "X", "pid": 0, "tid": tid, "ts": start, "dur": duration})
+    return events
+
+  def exportTrace(self, path):
+    """
+    Writes the recorded timings to path as Chrome trace JSON
+    """
+    directory = os.path.dirname(path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+      json.dump({"traceEvents": self.traceEvents(), "displayTimeUnit": "ms"}, f)
+    return path
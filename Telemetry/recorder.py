@@ -0,0 +1,117 @@
+"""
+recorder.py: Low overhead columnar telemetry recording for simulation sessions
+A session is a directory holding one raw little-endian float64 file per column,
+plus columns.json, which lists the columns and how many rows have been flushed
+Columns can be memory mapped with loadSession without reading the whole file
+"""
+
+import json
+import os
+
+import numpy as np
+
+#Per-tick columns recorded from the physics engine and the first joystick
+COLUMNS = ("time", "x", "y", "rotation",
+           "velocity_x", "velocity_y", "z_velocity", "z_acceleration",
+           "frame_magnitude", "frame_direction",
+           "frswerve", "brswerve", "flswerve", "blswerve",
+           "frwheel", "brwheel", "flwheel", "blwheel",
+           "left_x", "left_y", "right_x", "right_y", "left_trigger", "right_trigger")
+AXES = ("left_x", "left_y", "right_x", "right_y", "left_trigger", "right_trigger")
+DTYPE = np.dtype("<f8")
+INDEX_FILE = "columns.json"
+
+
+class TelemetryRecorder:
+  def __init__(self, path, columns = COLUMNS, chunk_size = 4096):
+    """
+    Starts a new session in the directory at path
+    Rows are buffered in memory and written out every chunk_size rows
+    """
+    self.path = path
+    self.columns = tuple(columns)
+    os.makedirs(path, exist_ok=True)
+    #Column-major, so each column of a chunk is written with one contiguous write
+    self.buffer = np.zeros((chunk_size, len(self.columns)), dtype=DTYPE, order="F")
+    self.chunk_size = chunk_size
+    #Rows in the buffer, and rows already written to disk
+    self.buffered = 0
+    self.rows = 0
+    self.files = [open(os.path.join(path, column+".f8"), "wb") for column in self.columns]
+    self.closed = False
+    self.writeIndex()
+
+  def record(self, row):
+    """
+    Appends one row, given as a sequence of floats in column order
+    """
+    self.buffer[self.buffered] = row
+    self.buffered += 1
+    if self.buffered == self.chunk_size:
+      self.flush()
+
+  def recordSwerve(self, t, swerve, axes):
+    """
+    Appends the state of a primitivePhysics.Swerve and a joystick axes dict
+    """
+    positions = swerve.positions
+    frame_velocity = swerve.velocities["frame"]
+    frame_vector = swerve.vectors["frame"]
+    self.record((t, swerve.position[0], swerve.position[1], swerve.position[2],
+                 frame_velocity[0], frame_velocity[1], swerve.z_velocity, swerve.z_acceleration,
+                 frame_vector.magnitude, frame_vector.direction,
+                 positions["frswerve"], positions["brswerve"], positions["flswerve"], positions["blswerve"],
+                 positions["frwheel"], positions["brwheel"], positions["flwheel"], positions["blwheel"],
+                 axes["left_x"], axes["left_y"], axes["right_x"], axes["right_y"],
+                 axes["left_trigger"], axes["right_trigger"]))
+
+  def flush(self):
+    """
+    Writes the buffered rows to the column files
+    """
+    if self.buffered == 0:
+      return
+    for ind, f in enumerate(self.files):
+      self.buffer[:self.buffered, ind].tofile(f)
+      f.flush()
+    self.rows += self.buffered
+    self.buffered = 0
+    self.writeIndex()
+
+  def writeIndex(self):
+    #Written after the data, so a reader never sees rows that are not on disk yet
+    index_path = os.path.join(self.path, INDEX_FILE)
+    with open(index_path+".tmp", "w") as f:
+      json.dump({"columns": self.columns, "dtype": DTYPE.str, "rows": self.rows}, f)
+    os.replace(index_path+".tmp", index_path)
+
+  def close(self):
+    if self.closed:
+      return
+    self.flush()
+    for f in self.files:
+      f.close()
+    self.closed = True
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+def loadSession(path):
+  """
+  Memory maps every column of a recorded session
+  Returns a dict of read-only arrays keyed by column name
+  """
+  with open(os.path.join(path, INDEX_FILE)) as f:
+    index = json.load(f)
+  dtype = np.dtype(index["dtype"])
+  columns = {}
+  for column in index["columns"]:
+    if index["rows"] == 0:
+      columns[column] = np.zeros(0, dtype=dtype)
+    else:
+      columns[column] = np.memmap(os.path.join(path, column+".f8"), dtype=dtype,
+                                  mode="r", shape=(index["rows"],))
+  return columns
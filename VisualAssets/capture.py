@@ -0,0 +1,78 @@
+"""
+capture.py: Copies rendered frames out of a Panda3D window or offscreen buffer into image files
+The render thread only copies each frame's raw pixels, the images are flipped, converted
+and written by a pool of background threads
+Frames are numbered binary PPM files, which ffmpeg turns into a video with, for example:
+  ffmpeg -framerate 30 -i frame_%06d.ppm -pix_fmt yuv420p session.mp4
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from panda3d.core import GraphicsOutput, Texture
+
+#Frames which may wait to be written before the render thread waits for the writers
+MAX_PENDING = 32
+
+
+def writePPM(path, pixels, width, height, components):
+  """
+  Writes raw Panda3D texture pixels as a binary PPM
+  Panda3D stores rows bottom up in BGR(A) order, so rows are flipped and channels reordered
+  """
+  image = np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, components)
+  image = image[::-1, :, 2::-1] if components >= 3 else np.repeat(image[::-1, :, :1], 3, axis=2)
+  with open(path, "wb") as f:
+    f.write("P6\n{} {}\n255\n".format(width, height).encode())
+    f.write(np.ascontiguousarray(image).tobytes())
+
+class FrameCapture:
+  def __init__(self, win, directory, workers = 4, max_pending = MAX_PENDING, name = "frame"):
+    """
+    Captures every frame rendered to win into directory, as name_000000.ppm onward
+    """
+    self.directory = directory
+    self.name = name
+    os.makedirs(directory, exist_ok=True)
+    #Panda3D copies each rendered frame into the texture's RAM image
+    self.texture = Texture("capture")
+    win.addRenderTexture(self.texture, GraphicsOutput.RTMCopyRam)
+    self.executor = ThreadPoolExecutor(workers, thread_name_prefix="capture")
+    self.pending = threading.BoundedSemaphore(max_pending)
+    self.futures = []
+    self.frames = 0
+
+  def framePath(self, frame):
+    return os.path.join(self.directory, "{}_{:06d}.ppm".format(self.name, frame))
+
+  def capture(self):
+    """
+    Queues the last rendered frame to be written, returning False if no frame has been rendered yet
+    Waits for the writers if MAX_PENDING frames are already queued
+    """
+    texture = self.texture
+    if not texture.hasRamImage():
+      return False
+    pixels = bytes(memoryview(texture.getRamImage()))
+    self.pending.acquire()
+    future = self.executor.submit(writePPM, self.framePath(self.frames), pixels,
+                                  texture.getXSize(), texture.getYSize(), texture.getNumComponents())
+    future.add_done_callback(lambda future: self.pending.release())
+    self.futures.append(future)
+    #Finished writes are dropped, keeping only ones which may still raise
+    if len(self.futures) > 2*MAX_PENDING:
+      self.futures = [future for future in self.futures if not future.done() or future.exception()]
+    self.frames += 1
+    return True
+
+  def close(self):
+    """
+    Waits for every queued frame to be written, raising the first error a writer hit
+    """
+    self.executor.shutdown(wait=True)
+    for future in self.futures:
+      future.result()
+    self.futures = []
+    return self.frames
@@ -3,10 +3,10 @@ graphs.py: Generates a graph image based off two related axes of data
 6/27/2019 Holiday Pettijohn
 """
 
-from collections import OrderedDict
 from math import ceil, cos, floor, log, pi, sin, sqrt
 from time import time
 
+import numpy as np
 from PIL import Image, ImageColor, ImageDraw
 
 
@@ -37,12 +37,20 @@ class XYGraph(Graph):
                x_tick_space = 2, ideal_num_ticks = 8, ideal_tick_buffer = .1,
                x_range = 10, x_axis_name = "Time", y_axis_name = "Value",
                buffer_size = .1, tick_length = .1, number_spacing = .1,
-               decimals = 1, data_edge_buffer = .1):
+               decimals = 1, data_edge_buffer = .1, history_size = 4096):
     #Reference name for use outside graph
     self.name = name
     #The location the graph will render on the screen
     self.location = location
-    self.data = OrderedDict()
+    #Data is kept in a fixed size ring buffer of (time, value) samples, so memory stays flat
+    #Every sample is written twice, history_size apart, so the samples in
+    #chronological order are always the contiguous slice [head:head+count]
+    self.history_size = history_size
+    self.times = np.zeros(2*history_size)
+    self.values = np.zeros(2*history_size)
+    #Index of the oldest sample, and the number of samples held
+    self.head = 0
+    self.count = 0
     self.size = graph_size
     #The number of x/y values to display on the graph
     self.x_range = x_range
@@ -119,7 +127,10 @@ class XYGraph(Graph):
     tick_origin = self.graph_origin
     tick_locations = []
     #Finds how many y values are represented by the graph
-    rough_y_max, rough_y_min = max(data_values), min(data_values)
+    if len(data_values) == 0:
+      rough_y_max, rough_y_min = 0, 0
+    else:
+      rough_y_max, rough_y_min = float(data_values.max()), float(data_values.min())
     #Finds tick numbers and intervals which are intuitive and closest to the desired number of ticks
     y_max, y_min, tick_interval, num_ticks, scale = self.getTickInterval(rough_y_max, rough_y_min)
     y_range = y_max-y_min
@@ -193,12 +204,11 @@ class XYGraph(Graph):
     graph_start_time = self.findGraphStartTime(current_time)
     #Draws the static parts of the graph, i.e. names, edges
     self.drawOutline(graph_start_time)
-    data = self.getReleventData(graph_start_time)
-    data_values = self.getReleventData(graph_start_time).values()
+    data_times, data_values = self.getReleventData(graph_start_time)
     y_tick_locations, y_tick_values, y_tick_range, scale = self.placeYTicks(data_values)
     self.drawStaticLabels()
     self.drawTicks(graph_start_time, y_tick_locations, y_tick_values, scale)
-    self.plotData(data, graph_start_time, y_tick_range, tick_min=min(y_tick_values))
+    self.plotData(data_times, data_values, graph_start_time, y_tick_range, tick_min=min(y_tick_values))
     return self.points, self.strings
   
   def peek(self, current_time):
@@ -209,12 +219,11 @@ class XYGraph(Graph):
     graph_start_time = self.findGraphStartTime(current_time)
     #Draws the static parts of the graph, i.e. names, edges
     self.drawOutline(graph_start_time)
-    data = self.getReleventData(graph_start_time)
-    data_values = self.getReleventData(graph_start_time).values()
+    data_times, data_values = self.getReleventData(graph_start_time)
     y_tick_locations, y_tick_values, y_tick_range, scale = self.placeYTicks(data_values)
     self.drawStaticLabels()
     self.drawTicks(graph_start_time, y_tick_locations, y_tick_values, scale)
-    self.plotData(data, graph_start_time, y_tick_range, tick_min=min(y_tick_values))
+    self.plotData(data_times, data_values, graph_start_time, y_tick_range, tick_min=min(y_tick_values))
     return self.points, self.strings
 
   def findGraphStartTime(self, current_time):
@@ -224,11 +233,14 @@ class XYGraph(Graph):
     return best_time
 
   def getReleventData(self, graph_start_time):
-    relevant_data = {}
-    for time in self.data:
-      if time >= graph_start_time:
-        relevant_data[time] = self.data[time]
-    return relevant_data
+    """
+    Returns (times, values) arrays of the samples at or after graph_start_time
+    Samples are in time order, so the start is found with a binary search
+    """
+    times = self.times[self.head:self.head+self.count]
+    values = self.values[self.head:self.head+self.count]
+    start = np.searchsorted(times, graph_start_time, side="left")
+    return times[start:], values[start:]
 
   def clearImage(self):
     """
@@ -298,27 +310,22 @@ class XYGraph(Graph):
     self.strings.append(((self.graph_origin[0]-self.buffer_size*2.7, self.graph_origin[1]+self.graph_size[1]/1.5), makeVertical(self.y_axis_name)))
     self.strings.append(((self.graph_origin[0]+self.graph_size[0]/2, self.graph_origin[1]-self.buffer_size*2), self.x_axis_name))
 
-  def plotData(self, data, graph_start_time, y_tick_range, tick_min):
+  def plotData(self, data_times, data_values, graph_start_time, y_tick_range, tick_min):
     """
     Plots the graph's data
     """
-    points = self.dataToPoints(data, graph_start_time, y_tick_range, tick_min)
+    points = self.dataToPoints(data_times, data_values, graph_start_time, y_tick_range, tick_min)
     self.points.append(points)
 
-  def dataToPoints(self, data, graph_start_time, y_tick_range, tick_min):
+  def dataToPoints(self, data_times, data_values, graph_start_time, y_tick_range, tick_min):
     """
     Converts data to Panda3D compatible points
     """
-    points = []
     graph_shift = graph_start_time-self.start_time
-    for x in data:
-      y = (data[x]-tick_min)#/y_tick_range
-      #Transform x relative to time graph was created
-      x -= self.start_time+graph_shift
-      location = (x*self.x_distance_per_value+self.graph_origin[0],
-                  y*self.y_distance_per_value+self.graph_origin[1])
-      points.append(location)
-    return points
+    #Transform x relative to time graph was created
+    x = (data_times-(self.start_time+graph_shift))*self.x_distance_per_value+self.graph_origin[0]
+    y = (data_values-tick_min)*self.y_distance_per_value+self.graph_origin[1]#/y_tick_range
+    return list(zip(x.tolist(), y.tolist()))
 
   def propigateDataFromPoint(self, points, graph_start_time):
     """
@@ -326,8 +333,9 @@ class XYGraph(Graph):
     and last data point which is off the graph
     """
     data_time, data_point = points[0]
-    if len(self.data.items()) >= 2:
-      last_data_time, last_data_point = tuple(self.data.items())[-2]
+    if self.count >= 2:
+      last = self.head+self.count-2
+      last_data_time, last_data_point = self.times[last], self.values[last]
     else:
       last_data_time, last_data_point = 0, 0
     delta_time = data_time-last_data_time
@@ -340,12 +348,22 @@ class XYGraph(Graph):
   def update(self, y):
     """
     Creates a new datapoint at the current time with the given value
+    Once history_size samples are held, the oldest sample is overwritten
     """
-    #TODO: Keep this from being a memory leak
-    self.data[time()] = y
+    self.addSample(time(), y)
+
+  def addSample(self, t, y):
+    if self.count < self.history_size:
+      ind = self.head+self.count
+      self.count += 1
+    else:
+      ind = self.head
+      self.head = (self.head+1)%self.history_size
+    self.times[ind] = self.times[ind+self.history_size] = t
+    self.values[ind] = self.values[ind+self.history_size] = y
 
   def dummyUpdate(self):
-    self.data[time()] = 0
+    self.addSample(time(), 0)
 
 class PolarGraph(Graph):
   def __init__(self, name = "graph", location = (0, 0), points_per_circle = 40,
@@ -0,0 +1,166 @@
+"""
+hud.py: Persistent geometry and text nodes for drawing the heads-up display
+"""
+
+from itertools import chain
+
+import numpy as np
+from panda3d.core import (Geom, GeomLinestrips, GeomNode, GeomVertexData,
+                          GeomVertexFormat, TextNode)
+
+
+class GraphLines:
+  def __init__(self, name):
+    """
+    Holds one graph's polylines in a single dynamic vertex buffer
+    Each polyline is drawn as one strip of a shared GeomLinestrips primitive
+    """
+    vertex_data = GeomVertexData(name, GeomVertexFormat.getV3(), Geom.UHDynamic)
+    self.geom = Geom(vertex_data)
+    self.geom.addPrimitive(GeomLinestrips(Geom.UHDynamic))
+    #Points currently in the vertex buffer, in row order, as rows of (x, y)
+    self.points = np.zeros((0, 2), dtype=np.float32)
+    #Number of points in each polyline, which decides how the strips are split
+    self.lengths = ()
+
+  def update(self, lines):
+    """
+    Rewrites the range of vertices whose points changed since the last update, in one copy
+    The strips are only rebuilt if the number of points in a polyline changed
+    """
+    lengths = tuple(len(line) for line in lines)
+    total = sum(lengths)
+    coords = chain.from_iterable(chain.from_iterable(lines))
+    points = np.fromiter(coords, np.float32, 2*total).reshape(total, 2)
+    #Rows from first to last changed, or were added
+    common = min(total, len(self.points))
+    changed = np.flatnonzero((points[:common] != self.points[:common]).any(axis=1))
+    first = int(changed[0]) if len(changed) else common
+    if total > common:
+      last = total
+    else:
+      last = int(changed[-1])+1 if len(changed) else common
+    if first < last:
+      vertex_data = self.geom.modifyVertexData()
+      if vertex_data.getNumRows() < total:
+        #Grows in large steps, since polylines such as graph data change length often
+        vertex_data.setNumRows(max(total, 2*vertex_data.getNumRows()))
+      #Vertices are (x, 0, y), copied straight into the vertex buffer
+      vertices = np.zeros((last-first, 3), dtype=np.float32)
+      vertices[:, 0] = points[first:last, 0]
+      vertices[:, 2] = points[first:last, 1]
+      stride = vertex_data.getFormat().getArray(0).getStride()
+      memoryview(vertex_data.modifyArray(0)).cast("B")[first*stride:last*stride] = vertices.tobytes()
+    self.points = points
+    if lengths != self.lengths:
+      self.lengths = lengths
+      primitive = self.geom.modifyPrimitive(0)
+      primitive.clearVertices()
+      start = 0
+      for length in lengths:
+        if length >= 2:
+          primitive.addConsecutiveVertices(start, length)
+          primitive.closePrimitive()
+        start += length
+
+class HudLines:
+  def __init__(self, parent, name = "hud_lines"):
+    """
+    Draws the lines of every graph under one node attached to parent, usually aspect2d
+    """
+    self.node = GeomNode(name)
+    self.nodepath = parent.attachNewNode(self.node)
+    self.graphs = {}
+
+  def setLines(self, graph_name, lines):
+    """
+    Sets the polylines drawn for a graph, as returned by the graph's render method
+    """
+    if graph_name not in self.graphs:
+      self.graphs[graph_name] = GraphLines(graph_name)
+      self.node.addGeom(self.graphs[graph_name].geom)
+    self.graphs[graph_name].update(lines)
+
+  def show(self):
+    self.nodepath.show()
+
+  def hide(self):
+    self.nodepath.hide()
+
+class HudText:
+  def __init__(self, parent, default_scale = .07, name = "hud_text"):
+    """
+    Draws text boxes under one node attached to parent, usually aspect2d
+    Text nodes are only touched when their text, location or scale changes,
+    and nodes for removed text boxes are stashed in a pool for reuse
+    """
+    self.nodepath = parent.attachNewNode(name)
+    self.default_scale = default_scale
+    #Text box name -> [TextNode, NodePath, text, location, scale] as last applied
+    self.entries = {}
+    self.pool = []
+
+  def setTextboxes(self, textboxes):
+    """
+    Updates the displayed text to match textboxes
+    Keys are text box names, values are dicts with optional text, location, and scale
+    """
+    for name, textbox in textboxes.items():
+      entry = self.entries.get(name)
+      if entry == None:
+        entry = self.acquire()
+        self.entries[name] = entry
+      text = textbox.get("text")
+      location = textbox.get("location", (0, 0))
+      scale = textbox.get("scale", self.default_scale)
+      if text != None and text != entry[2]:
+        entry[0].setText(text)
+        entry[2] = text
+      if location != entry[3]:
+        entry[1].setPos(location[0], 0, location[1])
+        entry[3] = location
+      if scale != entry[4]:
+        entry[1].setScale(scale)
+        entry[4] = scale
+    if len(self.entries) > len(textboxes):
+      for name in [name for name in self.entries if name not in textboxes]:
+        self.release(self.entries.pop(name))
+
+  def acquire(self):
+    if self.pool:
+      entry = self.pool.pop()
+      entry[1].unstash()
+      return entry
+    node = TextNode("hud_text")
+    return [node, self.nodepath.attachNewNode(node), None, None, None]
+
+  def release(self, entry):
+    entry[1].stash()
+    self.pool.append(entry)
+
+  def show(self):
+    self.nodepath.show()
+
+  def hide(self):
+    self.nodepath.hide()
+
+def setGraphLabels(textboxes, graph_name, strings):
+  """
+  Writes a graph's (location, string) labels into textboxes as "<graph_name>_<index>" entries
+  Entries left from the last frame are updated in place, and only surplus entries are removed
+  """
+  ind = 0
+  for location, string in strings:
+    key = "{}_{}".format(graph_name, ind)
+    textbox = textboxes.get(key)
+    if textbox == None:
+      textboxes[key] = {"location": location, "text": string}
+    else:
+      textbox["location"] = location
+      textbox["text"] = string
+    ind += 1
+  key = "{}_{}".format(graph_name, ind)
+  while key in textboxes:
+    textboxes.pop(key)
+    ind += 1
+    key = "{}_{}".format(graph_name, ind)
@@ -3,6 +3,8 @@ app.py: The Panda3D app class which the robot simulator runs from
 6/27/2019 Holiday Pettijohn
 """
 
+import os
+import sys
 from math import atan2, cos, pi, sin, sqrt
 
 from direct.actor.Actor import Actor
@@ -11,13 +13,18 @@ from direct.interval.IntervalGlobal import Sequence
 from direct.showbase.Loader import Loader
 from direct.showbase.ShowBase import ShowBase
 from direct.task import Task
-from panda3d.core import (Geom, GeomLinestrips, GeomNode, GeomVertexData,
-                          GeomVertexFormat, GeomVertexWriter, InputDevice,
-                          LineSegs, Point3, TextNode, TransparencyAttrib)
+from panda3d.core import InputDevice
+
+#The code/ modules import each other by name, so code/ goes on the path before any of them load
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "code"))
 
 import Input.joy as joy
 import Physics.primitivePhysics as physics
 import VisualAssets.graphs as graphs
+import VisualAssets.hud as hud
+from overlay import Overlay
+from Telemetry.profiler import TaskProfiler
+from VisualAssets.hud import HudLines, HudText
 
 
 class Simulator(ShowBase):
@@ -46,10 +53,6 @@ class Simulator(ShowBase):
     self.pandaActor.reparentTo(self.render)
     self.pandaLocation = [0, 0, 0]
     self.setPandaToLocation()
-    #Lines to be rendered on the next frame
-    self.lines = []
-    self.lineNodes = []
-    self.lineNodePaths = []
     #Text boxes which will be rendered every frame
     #Key is a node name, value is a dict with
     #arguments such as text, location, and scale
@@ -58,12 +61,11 @@ class Simulator(ShowBase):
       self.textboxes = textboxes[0]
     else:
       self.textboxes = textboxes
-    self.textNodes = {}
-    self.textNodePaths = {}
     self.default_text_scale = default_text_scale
-    #Geometry drawing node
-    self.geom_node = GeomNode("drawer")
-    self.aspect2d.attach_new_node(self.geom_node)
+    #Graph lines, kept in persistent vertex buffers
+    self.hud_lines = HudLines(self.aspect2d)
+    #Text nodes, only updated when their text box changes
+    self.hud_text = HudText(self.aspect2d, self.default_text_scale)
     self.text_is_active = True
     #If the text toggle button has been up for more than one frame
     self.text_button_lifted = True
@@ -73,10 +75,15 @@ class Simulator(ShowBase):
     self.pandaActor.loop("walk")
     #Intantiates physics engine
     self.physics = physics.Swerve()
-    self.taskMgr.add(self.updateJoysticks, "updateJoysticks")
-    self.taskMgr.add(self.walkPandaToPhysics, "walkPandaToPhysics")
-    self.taskMgr.add(self.update2dDisplay, "update2dDisplay")
-    self.taskMgr.add(self.toggleText, "toggleText")
+    #Tasks are timed by the profiler, p shows the timings and o saves them to trace.json
+    self.profiler = TaskProfiler()
+    self.profiler.start(self.taskMgr)
+    self.profiler.addTask(self.taskMgr, self.updateJoysticks, "updateJoysticks")
+    self.profiler.addTask(self.taskMgr, self.walkPandaToPhysics, "walkPandaToPhysics")
+    self.profiler.addTask(self.taskMgr, self.update2dDisplay, "update2dDisplay")
+    self.profiler.addTask(self.taskMgr, self.toggleText, "toggleText")
+    self.accept("p", self.toggleProfiler)
+    self.accept("o", self.exportTrace)
     #Creates a graph of y vectors
     self.graphs = graph_objs
     #Adds dummy value to graph to prevent crash
@@ -118,6 +125,12 @@ class Simulator(ShowBase):
     self.graphs["vector_graph"].update(magnitude, direction)
     return Task.cont
 
+  def toggleProfiler(self):
+    self.profiler.toggleOverlay(Overlay())
+
+  def exportTrace(self):
+    print("Wrote task timings to {}".format(self.profiler.exportTrace("trace.json")))
+
   def setPandaToLocation(self):
     self.pandaActor.setPos(self.pandaLocation[0], self.pandaLocation[1], self.pandaLocation[2])
 
@@ -125,15 +138,14 @@ class Simulator(ShowBase):
     joystick_readings = []
     for joystick in self.joys:
       joystick_readings.append(joy.readJoystickValues(joystick))
-    self.joystick_readings = joystick_readings
+    #With no gamepad connected the panda stands still
+    self.joystick_readings = joystick_readings or [joy.neutralReadings()]
     return Task.cont
 
   def update2dDisplay(self, task):
     """
     Updates the 2d heads-up overlay
     """
-    #Removes all lines from the geometry node
-    self.geom_node.removeAllGeoms()
     if self.text_is_active:
       frvector = "Mag: {}\nDir: {}\nTheta_acc: {}\nVel_x: {}\nVel_y: {}\nVel_t: {}\nPos: {}, {}\nRot: {}".format(round(self.physics.vectors["frame"].magnitude, 4),
                                                     round(self.physics.vectors["frame"].direction, 4),
@@ -145,88 +157,13 @@ class Simulator(ShowBase):
                                                     round(self.physics.position[1], 4),
                                                     round(self.physics.position[2], 4))
       self.textboxes["frvector_value"]["text"] = frvector
-      self.lines = []
       for graph_name in self.graphs:
         lines, strings = self.graphs[graph_name].render()
-        #Splits the lines into pairs of points and assigns them to self.lines
-        for line in lines:
-          self.lines += pairPoints(line)
-        #Clears all graph generated strings from textboxes
-        deleted = []
-        for key in self.textboxes:
-          if graph_name in key:
-            deleted.append(key)
-        for key in deleted:
-          self.textboxes.pop(key)
-        #Processes strings into textboxes
-        for ind, val in enumerate(strings):
-          location, string = val
-          self.textboxes["{}_{}".format(graph_name, str(ind))] = {"location": location, "text": string}
-      self.manageTextNodes()
-      self.renderText()
-      self.manageGeometry()
+        self.hud_lines.setLines(graph_name, lines)
+        hud.setGraphLabels(self.textboxes, graph_name, strings)
+      self.hud_text.setTextboxes(self.textboxes)
     return Task.cont
 
-  def manageGeometry(self):
-    """
-    Manages geometry generation
-    """
-    #(Re)Renders all the lines which are in self.lines
-    for line in self.lines:
-      self.addLine(line)
-
-  def addLine(self, points):
-    """
-    Adds a line to class GeomNode from a pair of points
-    """
-    #Creates objects needed to draw a geometry on the HUD
-    #The vertex data which will define the rendered geometry
-    vertex_data = GeomVertexData("graph", GeomVertexFormat.getV3(), Geom.UHStatic)
-    #The object that writes vertexes the vertex data
-    writer = GeomVertexWriter(vertex_data, "vertex")
-    for point in points:
-      writer.add_data3f(point[0], 0, point[1])
-    #Defines that this geometry represents a polyline
-    primitive = GeomLinestrips(Geom.UHStatic)
-    #Tells geometry how many verticies will be added(?)
-    primitive.add_consecutive_vertices(0, 2)
-    primitive.close_primitive()
-    geometry = Geom(vertex_data)
-    geometry.add_primitive(primitive)
-    #Draws a graph on the HUD
-    self.geom_node.add_geom(geometry)
-
-  def manageTextNodes(self):
-    deleted = []
-    for name in self.textboxes:
-      if name not in self.textNodes:
-        #If the name has not been given a textNode object, set it up
-        self.textNodes[name] = TextNode(name)
-        self.textNodePaths[name] = self.aspect2d.attachNewNode(self.textNodes[name])
-    #Checks if any textNodes no longer have their respective textbox object and should be deleted
-    for name in self.textNodes:
-      if name not in self.textboxes:
-        deleted.append(name)
-    for node in deleted:
-      self.textNodePaths[node].removeNode()
-      self.textNodePaths.pop(node)
-      self.textNodes.pop(node)
-    
-  def renderText(self):
-    for name in self.textboxes:
-      if "location" in self.textboxes[name]:
-        location = self.textboxes[name]["location"]
-      else:
-        location = (0, 0)
-      if "scale" in self.textboxes[name]:
-        scale = self.textboxes[name]["scale"]
-      else:
-        scale = self.default_text_scale
-      if "text" in self.textboxes[name]:
-        self.textNodes[name].setText(self.textboxes[name]["text"])
-      self.textNodePaths[name].setScale(scale)
-      self.textNodePaths[name].setPos(location[0], 0, location[1])
-
   def toggleText(self, task):
     if self.joystick_readings[0]["axes"]["right_trigger"] >= .05 and self.text_button_lifted:
       self.text_is_active = not self.text_is_active
@@ -236,36 +173,14 @@ class Simulator(ShowBase):
       self.text_button_lifted = True
     if not self.text_toggled:
       if not self.text_is_active:
-        for path in self.textNodePaths:
-          self.textNodePaths[path].detachNode()
-        for path in self.lineNodePaths:
-          path.detachNode()
+        self.hud_text.hide()
+        self.hud_lines.hide()
       else:
-        for node in self.textNodes:
-          self.textNodePaths[node] = self.aspect2d.attachNewNode(self.textNodes[node])
-        for node in self.lineNodes:
-          self.aspect2d.attachNewNode(node)
+        self.hud_text.show()
+        self.hud_lines.show()
+      self.text_toggled = True
     return Task.cont
 
-def pairPoints(points, closed=False):
-  """
-  Seperates a series of points into a series of lines connecting the points
-  """
-  pairs = []
-  for ind, point in enumerate(points):
-    if ind == len(points)-1:
-      #If on the last point of the set
-      #break the loop or link back to the start
-      #depending on arguments
-      if closed:
-        pairs.append((point, points[0]))
-      else:
-        break
-    else:
-      #If not on the last point, add the next line as a pair of points
-      pairs.append((point, points[ind+1]))
-  return pairs
-
 graphs = {"y_graph": graphs.XYGraph(location=(-.4,-.4)), "vector_graph": graphs.PolarGraph(location=(-.8, -.5))}
 app = Simulator(textboxes={"frvector_label": {}, "frvector_value": {"location": (.4, .7)}}, graph_objs = graphs)
 app.run()
@@ -0,0 +1,286 @@
+"""
+run.py: Benchmarks the physics, graph, HUD, skid mark and model loading hot paths
+Results are saved to benchmarks/results/<revision>.json and compared against the
+most recent results saved for another revision, so regressions show up between commits
+Run from the repository root, for example:
+  python -m benchmarks.run
+  python -m benchmarks.run -k graph --baseline 1a2b3c4
+Panda3D parts run without a window; pass --window-type offscreen to use a real GL buffer
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from math import cos, pi, sin
+from timeit import Timer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+#A benchmark this many times slower than the baseline is reported as a regression
+REGRESSION_RATIO = 1.25
+#Seconds spent timing each benchmark
+TIME_BUDGET = .2
+
+#Registered benchmarks, as (name, setup) pairs
+#setup takes no arguments and returns the function to time
+BENCHMARKS = []
+
+base = None
+
+
+def benchmark(name):
+  def register(setup):
+    BENCHMARKS.append((name, setup))
+    return setup
+  return register
+
+def startPanda(window_type = "none"):
+  """
+  Starts a ShowBase without a visible window, once, for the benchmarks which need a scene graph
+  """
+  global base
+  if base == None:
+    from panda3d.core import loadPrcFileData
+    loadPrcFileData("benchmarks", "window-type {}\naudio-library-name null\nmodel-path {}"
+                    .format(window_type, os.path.join(ROOT, "models")))
+    from direct.showbase.ShowBase import ShowBase
+    base = ShowBase()
+    #The skid marks and model cache are written to be run from the code directory
+    sys.path.insert(0, os.path.join(ROOT, "code"))
+  return base
+
+@benchmark("physics: Swerve.step")
+def benchSwerveStep():
+  import Physics.primitivePhysics as physics
+  swerve = physics.Swerve()
+  swerve.sendControls(.3, .8, .2)
+  return lambda: swerve.step(1/60)
+
+@benchmark("physics: BatchSwerve.step, 1000 robots")
+def benchBatchStep():
+  from Physics.batchPhysics import BatchSwerve
+  swerves = BatchSwerve(1000)
+  swerves.sendControls(.3, .8, .2)
+  return lambda: swerves.step(1/60)
+
+def vectorCase(cls, name):
+  from benchmarks.vectors import CASES
+  setup, statement = [(setup, statement) for case, setup, statement in CASES if case == name][0]
+  if type(setup) == dict:
+    setup, statement = setup[cls], statement[cls]
+  namespace = {cls.__name__: cls}
+  exec(setup.format(cls=cls.__name__), namespace)
+  code = compile(statement.format(cls=cls.__name__), name, "exec")
+  return lambda: exec(code, namespace)
+
+@benchmark("vectors: Vector add")
+def benchVectorAdd():
+  from Physics.vectors import Vector
+  return vectorCase(Vector, "add")
+
+@benchmark("vectors: FastVector add in place")
+def benchFastVectorAdd():
+  from Physics.vectors import FastVector
+  return vectorCase(FastVector, "add in place")
+
+@benchmark("vectors: Vector total of four")
+def benchVectorTotal():
+  from Physics.vectors import Vector
+  return vectorCase(Vector, "total four polar vectors")
+
+@benchmark("vectors: FastVector total of four")
+def benchFastVectorTotal():
+  from Physics.vectors import FastVector
+  return vectorCase(FastVector, "total four polar vectors")
+
+def filledXYGraph(history_size):
+  """
+  Returns an XYGraph holding history_size samples, all inside its visible window
+  """
+  import VisualAssets.graphs as graphs
+  graph = graphs.XYGraph(history_size=history_size)
+  now = time.time()
+  graph.start_time = now-2*graph.x_range
+  for ind in range(history_size):
+    graph.addSample(now-graph.x_range+graph.x_range*ind/history_size, (ind%97)/10-4)
+  return graph
+
+for history_size in (256, 4096, 65536):
+  @benchmark("graphs: XYGraph.render, {} samples".format(history_size))
+  def benchXYRender(history_size = history_size):
+    graph = filledXYGraph(history_size)
+    return graph.render
+
+  @benchmark("graphs: XYGraph.placeYTicks, {} samples".format(history_size))
+  def benchPlaceYTicks(history_size = history_size):
+    graph = filledXYGraph(history_size)
+    _, values = graph.getReleventData(graph.findGraphStartTime(time.time()))
+    return lambda: graph.placeYTicks(values)
+
+@benchmark("graphs: XYGraph.getTickInterval")
+def benchTickInterval():
+  graph = filledXYGraph(16)
+  return lambda: graph.getTickInterval(5.3, -4.1)
+
+@benchmark("graphs: PolarGraph.render")
+def benchPolarRender():
+  import VisualAssets.graphs as graphs
+  graph = graphs.PolarGraph()
+  graph.update(.8, pi/3)
+  return graph.render
+
+@benchmark("hud: HudLines.setLines, XYGraph lines")
+def benchHudLines():
+  #Replaces the pairPoints benchmark, since HudLines took over its job
+  from panda3d.core import NodePath
+  from VisualAssets.hud import HudLines
+  graph = filledXYGraph(4096)
+  hud_lines = HudLines(NodePath("hud"))
+  frames = []
+  for _ in range(2):
+    graph.addSample(time.time(), 1)
+    frames.append([list(line) for line in graph.render()[0]])
+  ind = [0]
+  def setLines():
+    ind[0] ^= 1
+    hud_lines.setLines("graph", frames[ind[0]])
+  return setLines
+
+@benchmark("hud: HudText.setTextboxes, 40 labels, unchanged")
+def benchHudText():
+  from panda3d.core import NodePath
+  from VisualAssets.hud import HudText
+  hud_text = HudText(NodePath("hud"))
+  textboxes = {"label_{}".format(ind): {"location": (ind/40, 0), "text": str(ind)} for ind in range(40)}
+  return lambda: hud_text.setTextboxes(textboxes)
+
+def skidPoints():
+  """
+  Points of a wheel driving in a circle, turning enough that no point is skipped
+  """
+  return [(5*cos(ind*pi/90), 5*sin(ind*pi/90), ind*2+90) for ind in range(180)]
+
+@benchmark("skid: SkidTrack.addPoint")
+def benchSkidTrack():
+  startPanda()
+  from skid import SkidTrack
+  track = SkidTrack(nrects=300)
+  points = skidPoints()
+  ind = [0]
+  def addPoint():
+    x, y, angle = points[ind[0]%len(points)]
+    ind[0] += 1
+    track.addPoint(x, y, angle, 1.0)
+  return addPoint
+
+@benchmark("skid: SkidMarks.addPoint")
+def benchSkidMarks():
+  startPanda()
+  from skid import SkidMarks
+  marks = SkidMarks()
+  points = skidPoints()
+  ind = [0]
+  def addPoint():
+    x, y, angle = points[ind[0]%len(points)]
+    ind[0] += 1
+    marks.addPoint(ind[0]%4, x, y, angle, 1.0)
+  return addPoint
+
+@benchmark("models: load wheel_1.obj")
+def benchLoadObj():
+  base = startPanda()
+  return lambda: base.loader.loadModel("wheel_1.obj", noCache=True)
+
+@benchmark("models: load wheel_1 from the bam cache")
+def benchLoadBam():
+  base = startPanda()
+  import modelcache
+  path = modelcache.convertModel(modelcache.findSource("wheel_1.obj"))
+  from panda3d.core import Filename
+  return lambda: base.loader.loadModel(Filename.fromOsSpecific(path), noCache=True)
+
+def timeFunction(func):
+  """
+  Returns the best time per call of func, in microseconds
+  """
+  timer = Timer(func)
+  number, elapsed = timer.autorange()
+  repeats = max(3, int(TIME_BUDGET/max(elapsed, 1e-9)))
+  return min(timer.repeat(repeat=min(repeats, 20), number=number))/number*1e6
+
+def gitRevision():
+  """
+  Returns the short revision of HEAD, with "-dirty" if there are uncommitted changes
+  """
+  try:
+    revision = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT).decode().strip()
+    dirty = subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT).strip()
+  except (OSError, subprocess.CalledProcessError):
+    return "unknown"
+  return revision+"-dirty" if dirty else revision
+
+def loadResults(revision):
+  with open(os.path.join(RESULTS_DIR, revision+".json")) as f:
+    return json.load(f)
+
+def findBaseline(revision):
+  """
+  Returns the most recently saved results of any other revision, or None
+  """
+  if not os.path.isdir(RESULTS_DIR):
+    return None
+  saved = []
+  for name in os.listdir(RESULTS_DIR):
+    if name.endswith(".json") and name[:-5] != revision:
+      saved.append(loadResults(name[:-5]))
+  return max(saved, key=lambda results: results["date"], default=None)
+
+def runBenchmarks(pattern = "", window_type = "none"):
+  if window_type != "none":
+    startPanda(window_type)
+  results = {}
+  for name, setup in BENCHMARKS:
+    if pattern not in name:
+      continue
+    results[name] = timeFunction(setup())
+    print("{:<52}{:>14.3f} us".format(name, results[name]))
+  return results
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmarks the simulator's hot paths")
+  parser.add_argument("-k", default="", help="only run benchmarks whose name contains this")
+  parser.add_argument("--baseline", help="revision to compare against, defaults to the latest other saved one")
+  parser.add_argument("--window-type", default="none", choices=("none", "offscreen"))
+  parser.add_argument("--no-save", action="store_true", help="do not save the results")
+  args = parser.parse_args()
+  revision = gitRevision()
+  results = runBenchmarks(args.k, args.window_type)
+  if not args.no_save:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, revision+".json")
+    #Runs with -k only replace the benchmarks they ran
+    saved = loadResults(revision)["results"] if os.path.isfile(path) else {}
+    saved.update(results)
+    with open(path, "w") as f:
+      json.dump({"revision": revision, "date": time.time(), "python": platform.python_version(),
+                 "machine": platform.node(), "results": saved}, f, indent=2, sort_keys=True)
+  baseline = loadResults(args.baseline) if args.baseline else findBaseline(revision)
+  if baseline == None:
+    return
+  print("\nCompared with {}:".format(baseline["revision"]))
+  regressions = 0
+  for name, result in results.items():
+    if name not in baseline["results"]:
+      continue
+    ratio = result/baseline["results"][name]
+    flag = "  REGRESSION" if ratio > REGRESSION_RATIO else ""
+    regressions += bool(flag)
+    print("{:<52}{:>10.2f}x{}".format(name, ratio, flag))
+  sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+  main()
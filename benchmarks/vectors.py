@@ -0,0 +1,45 @@
+"""
+vectors.py: Microbenchmark comparing Vector with the allocation-free FastVector
+Run from the repository root with: python -m benchmarks.vectors
+"""
+
+from timeit import repeat
+
+from Physics.vectors import FastVector, Vector
+
+#Each case is a (name, setup, statement) triple, with {cls} replaced by the vector class name
+#Setups and statements may instead be dicts keyed by class, where the classes are used differently
+CASES = (("construct polar", "", "{cls}(1.5, .3)"),
+         ("construct component", "", "{cls}(component=(1.5, .3))"),
+         ("set polar, read component", "v = {cls}(0, 0)",
+          "v.setMagnitude(1.5); v.setDirection(.3); v.component"),
+         ("add", "a = {cls}(1.5, .3); b = {cls}(.5, 2)", "a+b"),
+         ("add in place", "a = {cls}(1.5, .3); b = {cls}(.5, 2)", "a += b"),
+         #Accumulation pattern used by updateFrameVectors
+         ("total four polar vectors",
+          {Vector: "vs = [Vector(1, d) for d in (.1, .2, .3, .4)]",
+           FastVector: "vs = [FastVector(1, d) for d in (.1, .2, .3, .4)]\ntotal = FastVector(0, 0)"},
+          {Vector: "total = Vector(0, 0)\nfor v in vs: total += v\ntotal.magnitude",
+           FastVector: "total.setComponent(0, 0)\nfor v in vs: total += v\ntotal.magnitude"}))
+
+
+def timeCase(cls, setup, statement, number, repeats):
+  """
+  Returns the best time per run of statement, in microseconds
+  """
+  if type(setup) == dict:
+    setup = setup[cls]
+  if type(statement) == dict:
+    statement = statement[cls]
+  times = repeat(statement.format(cls=cls.__name__), setup.format(cls=cls.__name__),
+                 number=number, repeat=repeats, globals={cls.__name__: cls})
+  return min(times)/number*1e6
+
+def main(number = 100000, repeats = 5):
+  print("{:<28}{:>14}{:>18}{:>10}".format("case", "Vector (us)", "FastVector (us)", "speedup"))
+  for name, setup, statement in CASES:
+    old, new = (timeCase(cls, setup, statement, number, repeats) for cls in (Vector, FastVector))
+    print("{:<28}{:>14.3f}{:>18.3f}{:>10.2f}".format(name, old, new, old/new))
+
+if __name__ == "__main__":
+  main()
@@ -6,16 +6,62 @@ from math import pi, sin, cos
 from direct.task import Task
 from panda3d.core import PointLight 
 from panda3d.core import VBase4
+import modelcache
+
+def coneTemplate():
+	"""
+	Returns the cone model shared by every cone.  It is loaded the first time it is needed.
+	"""
+	if Cones.template == None:
+		Cones.template = modelcache.loadModel(loader, "cone_1.obj")
+	return Cones.template
 
 class Cones:
+	template = None
+
 	def __init__(self):
 		self.dummy = 0.0
 
 	def loadModel(self):
-		self.cone = loader.loadModel("cone_1.obj", noCache=True)
-		self.cone.reparentTo(render)
+		self.cone = render.attachNewNode("Cone")
+		coneTemplate().instanceTo(self.cone)
 		self.cone.setPos(0.0, 0.0, 0.0)
 
 	def setPos(self, x, y):
 		self.cone.setX(x)
 		self.cone.setY(y)
+
+class ConeField:
+	"""
+	Holds many cones under one node.  Cones that will not move can be flattened together,
+	so the whole field is drawn with a few draw calls instead of one or more per cone.
+	"""
+	def __init__(self, name="ConeField"):
+		self.nodepath = render.attachNewNode(name)
+		self.cones = []
+
+	def addCone(self, x, y):
+		"""
+		Places an instance of the cone model at x, y and returns its node
+		"""
+		cone = self.nodepath.attachNewNode("Cone")
+		coneTemplate().instanceTo(cone)
+		cone.setPos(x, y, 0.0)
+		self.cones.append(cone)
+		return cone
+
+	def flatten(self):
+		"""
+		Bakes the cone positions into one set of geometry.  Cones can not be moved afterwards,
+		but more can still be added.
+		"""
+		# Instanced nodes have more than one parent, and the flattener leaves those alone.  So
+		# each instance is swapped for a copy, which only copies the nodes and shares the geometry.
+		template = coneTemplate()
+		for cone in self.cones:
+			cone.getChildren().detach()
+			template.copyTo(cone)
+		# The copied model roots would otherwise keep every cone in its own node
+		self.nodepath.clearModelNodes()
+		self.nodepath.flattenStrong()
+		self.cones = []
@@ -0,0 +1,105 @@
+# modelcache.py -- Converts the Wavefront models to flattened .bam files and loads them
+#
+# The first load of an .obj parses it, flattens it, and writes models/cache/<name>-<hash>.bam.
+# Later loads read the .bam instead.  The hash covers the .obj and the .mtl files it uses,
+# so editing either one makes a new cache file on the next load.
+#
+# The whole cache can be built ahead of time with:
+#   python code/modelcache.py
+#
+import argparse
+import glob
+import hashlib
+import os
+from panda3d.core import Filename, LoaderOptions, NodePath, getModelPath
+from panda3d.core import Loader as PandaLoader
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+CACHE_DIR = os.path.join(MODEL_DIR, "cache")
+#Bump when the conversion changes, so old cache files are not used
+CACHE_VERSION = b"1"
+
+#Source path -> cache path, so each model is only hashed once per run
+cache_paths = {}
+
+def findSource(name):
+	"""
+	Finds a model in the models directory, or else on Panda's model-path
+	"""
+	if os.path.isfile(name):
+		return os.path.abspath(name)
+	path = os.path.join(MODEL_DIR, name)
+	if os.path.isfile(path):
+		return path
+	found = getModelPath().getValue().findFile(Filename(name))
+	if found.empty():
+		raise IOError("Could not find model {}".format(name))
+	return found.toOsSpecific()
+
+def materialFiles(source):
+	"""
+	Lists the .mtl files named by an .obj's mtllib lines
+	"""
+	paths = []
+	with open(source, "rb") as f:
+		for line in f:
+			if line.startswith(b"mtllib"):
+				for name in line.split()[1:]:
+					path = os.path.join(os.path.dirname(source), name.decode())
+					if os.path.isfile(path):
+						paths.append(path)
+	return paths
+
+def contentHash(source):
+	digest = hashlib.sha1(CACHE_VERSION)
+	for path in [source] + materialFiles(source):
+		with open(path, "rb") as f:
+			digest.update(f.read())
+	return digest.hexdigest()[:16]
+
+def cachePath(source):
+	if source not in cache_paths:
+		name = os.path.splitext(os.path.basename(source))[0]
+		cache_paths[source] = os.path.join(CACHE_DIR, "{}-{}.bam".format(name, contentHash(source)))
+	return cache_paths[source]
+
+def convertModel(source):
+	"""
+	Parses an .obj, flattens it, and writes it to the cache unless it is already there
+	Returns the cache path
+	"""
+	path = cachePath(source)
+	if os.path.isfile(path):
+		return path
+	options = LoaderOptions(LoaderOptions.LF_no_cache | LoaderOptions.LF_report_errors)
+	node = PandaLoader.getGlobalPtr().loadSync(Filename.fromOsSpecific(source), options)
+	if node == None:
+		raise IOError("Could not load model {}".format(source))
+	model = NodePath(node)
+	#The models are static, so their nodes and geoms can all be merged
+	model.flattenStrong()
+	os.makedirs(CACHE_DIR, exist_ok=True)
+	#Written beside the final path first, so a half-written file is never loaded
+	temp_path = path + ".tmp"
+	if not model.writeBamFile(Filename.fromOsSpecific(temp_path)):
+		raise IOError("Could not write {}".format(temp_path))
+	os.replace(temp_path, path)
+	return path
+
+def loadModel(loader, name):
+	"""
+	Drop-in for loader.loadModel(name, noCache=True) on .obj models
+	Panda's model pool keeps the loaded .bam, so loading a model again only copies it
+	"""
+	return loader.loadModel(Filename.fromOsSpecific(convertModel(findSource(name))))
+
+def main():
+	parser = argparse.ArgumentParser(description="Converts models/*.obj to cached .bam files")
+	parser.add_argument("models", nargs="*", help="models to convert, defaults to every .obj in models/")
+	args = parser.parse_args()
+	sources = [findSource(name) for name in args.models] or sorted(glob.glob(os.path.join(MODEL_DIR, "*.obj")))
+	for source in sources:
+		print("{} -> {}".format(os.path.basename(source), os.path.relpath(convertModel(source), MODEL_DIR)))
+
+if __name__ == "__main__":
+	main()
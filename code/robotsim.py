@@ -8,16 +8,17 @@ from panda3d.core import PointLight
 from panda3d.core import VBase4
 from panda3d.core import Mat4
 from swervebot import SwerveBot
-from cones import Cones
+from cones import ConeField
 from skid import SkidTrack
 from overlay import Overlay
 from gamepad_logitech import GamePad_Logitech
+import modelcache
 import sys
 
 class RobotSim (ShowBase) :
 	def __init__(self):
 		ShowBase.__init__(self)
-		self.scene = self.loader.loadModel("field_1.obj", noCache=True)
+		self.scene = modelcache.loadModel(self.loader, "field_1.obj")
 		# Reparent the model to render.
 		self.scene.reparentTo(self.render)
 		self.scene.setPos(0, 0, 0)
@@ -60,7 +61,7 @@ class RobotSim (ShowBase) :
 		#self.resetCamPosition()
 
 	def insertLight(self, name, x, y, z):
-		lightball = self.loader.loadModel("lightball_1.obj", noCache=True)
+		lightball = modelcache.loadModel(self.loader, "lightball_1.obj")
 		lightball.reparentTo(self.render)
 		lightball.setPos(x, y, z)
 		plight = PointLight(name)
@@ -70,14 +71,13 @@ class RobotSim (ShowBase) :
 		self.render.setLight(plnp)
 
 	def setupCones(self):
-		self.cones = []
+		self.cones = ConeField()
 		conepos = [(20, 20), (18, 0)]
 		for cp in conepos:
-			c = Cones()
-			c.loadModel()
 			x, y = cp
-			c.setPos(x, y)
-			self.cones.append(c)
+			self.cones.addCone(x, y)
+		#The cones never move, so they are merged into one batch
+		self.cones.flatten()
 
 	def reportStatus(self):
 		x=base.camera.getX()
@@ -13,20 +13,92 @@ from panda3d.core import GeomVertexFormat
 from panda3d.core import GeomVertexData
 from panda3d.core import GeomVertexWriter
 from panda3d.core import GeomTriangles
+from panda3d.core import GeomVertexArrayFormat
+from panda3d.core import InternalName
+from panda3d.core import Shader
+from panda3d.core import TransparencyAttrib
+from panda3d.core import ClockObject
 from overlay import Overlay
+import struct
+
+# What SkidDecimator.addPoint decided to do with a point
+SKID_SKIP = 0     # The point is too close to the last kept point, so it is dropped
+SKID_START = 1    # The first point of a trail.  Nothing is drawn yet.
+SKID_NEW = 2      # A new rectangle runs from the last kept point to this one
+SKID_EXTEND = 3   # The last rectangle is stretched to end at this point
+
+def angleBetween(a, b):
+	"""
+	Returns the smallest angle between two directions, in degrees
+	"""
+	return 180 - math.fabs(math.fabs(a - b) % 360 - 180)
+
+def forceToColor(force):
+	"""
+	Returns the vertex color of a skid mark made with the given force, between zero and one
+	"""
+	if force < 0.1:
+		force = 0.1
+	if force > 1.0:
+		force = 1.0
+	if force < 0.2:
+		return (1, 1, 1, 1)
+	w = 1.0 - force
+	return(w, w, w, 1)
+
+class SkidDecimator:
+	"""
+	Decides which points of a skid trail are worth drawing.  A point is only kept once the wheel has
+	moved more than 'min_distance', or turned more than 'min_angle' degrees, since the last kept point.
+	While the wheel keeps rolling straight, kept points stretch the last rectangle instead of adding
+	one, up to 'max_length' long, so straight runs use a single rectangle.
+	"""
+	def __init__(self, min_distance=0.1, min_angle=5.0, max_length=5.0):
+		self.min_distance = min_distance
+		self.min_angle = min_angle
+		self.max_length = max_length
+		self.clear()
+
+	def clear(self):
+		self.last = None          # X, Y, and wheel direction of the last kept point
+		self.start = None         # X, Y, and wheel direction where the last rectangle starts
+		self.heading = 0.0        # Direction of travel along the last rectangle, in degrees
+
+	def addPoint(self, x, y, wheel_dir):
+		"""
+		Returns one of SKID_SKIP, SKID_START, SKID_NEW or SKID_EXTEND for the point
+		"""
+		if self.last == None:
+			self.last = (x, y, wheel_dir)
+			return SKID_START
+		lx, ly, ldir = self.last
+		if math.hypot(x - lx, y - ly) < self.min_distance and angleBetween(wheel_dir, ldir) < self.min_angle:
+			return SKID_SKIP
+		if self.start != None:
+			sx, sy, sdir = self.start
+			heading = math.atan2(y - sy, x - sx) * 180 / math.pi
+			if (angleBetween(wheel_dir, sdir) < self.min_angle and angleBetween(wheel_dir, ldir) < self.min_angle
+					and angleBetween(heading, self.heading) < self.min_angle and math.hypot(x - sx, y - sy) < self.max_length):
+				self.last = (x, y, wheel_dir)
+				return SKID_EXTEND
+		self.start = self.last
+		self.heading = math.atan2(y - ly, x - lx) * 180 / math.pi
+		self.last = (x, y, wheel_dir)
+		return SKID_NEW
 
 class SkidTrack:
 	"""
 	SkidTrack class maintains skid marks that fade over time.  Maintian one instance of this class for
 	each wheel that produces a skid mark.
 	"""
-	def __init__(self, nrects: int = 100, wheel_width=0.2, zpos=-0.38):
+	def __init__(self, nrects: int = 100, wheel_width=0.2, zpos=-0.38, min_distance=0.1, min_angle=5.0, max_length=5.0):
 		"""
 		Initalizes one track for a skid mark.  The mark will be placed parallel to X-Y in world coordinates.
 		They will be placed at the given height given by 'zpos'.  The 'nrects' argument specifies how long
 		the skid can be in input point locations.  You can make the skid mark longer by increasing nrects, or
 		spreading out the distance between input points.  Once nrect points have been input, the earlier points
 		will disappear.  The 'wheel-width' parameter is the thickness of the wheel that is producing the marks.
+		Input points are thinned out by a SkidDecimator, see there for 'min_distance', 'min_angle' and 'max_length'.
 		"""
 		self.wheel_width = wheel_width  # One unit = about 10 inches in current world.
 		self.wheel_state = [] 	# Tupels of: X, Y position of wheel, While Direction in degrees, and force
@@ -37,7 +109,7 @@ class SkidTrack:
 		vtx = GeomVertexWriter(self.vdata,  "vertex")
 		cx  = GeomVertexWriter(self.vdata,  "color")
 		prim = GeomTriangles(Geom.UHStatic)
-		c = self.forceToColor(0.0)
+		c = forceToColor(0.0)
 		# Here we set up all the vertexts and the primatives that use them.  For each set of four vertices, a
 		# flat rectangle is defined. Then 4 primatives are defined by splitting up the rectangle into pair of 2
 		# triangles -- 4 triangles per rectangle. Each pair of triangles are identical, except that their normals
@@ -67,18 +139,9 @@ class SkidTrack:
 		node.addGeom(geom)
 		self.nodepath = render.attachNewNode(node)
 		self.nextrect = 0
-		self.havelast = False
+		self.lastrect = 0
 		self.lastpoints = (0,0,0,0)
-
-	def forceToColor(self, force):
-		if force < 0.1:
-			force = 0.1
-		if force > 1.0:
-			force = 1.0
-		if force < 0.2:
-			return (1, 1, 1, 1)
-		w = 1.0 - force
-		return(w, w, w, 1)
+		self.decimator = SkidDecimator(min_distance, min_angle, max_length)
 
 	def addPoint(self, x, y, wheel_dir, force):
 		"""
@@ -87,6 +150,9 @@ class SkidTrack:
 		skid mark.  The argument 'wheel_dir' is given in degrees, where zero points toward the
 		positive X axis.
 		"""
+		action = self.decimator.addPoint(x, y, wheel_dir)
+		if action == SKID_SKIP:
+			return
 		h = self.wheel_width * 0.5
 		rads = (wheel_dir-90) * math.pi / 180.0
 		x0b, y0b = x + h*math.cos(rads), y + h*math.sin(rads)
@@ -94,26 +160,158 @@ class SkidTrack:
 		x1b, y1b = x + h*math.cos(rads), y + h*math.sin(rads)
 		x0a, y0a, x1a, y1a = self.lastpoints
 		self.lastpoints = (x0b, y0b, x1b, y1b)
-		if not self.havelast:
-			self.havelast = True
+		if action == SKID_START:
 			return
-		indx = self.nextrect*4
-		self.nextrect += 1
-		if self.nextrect >= self.nrects:
-			self.nextrect = 0
+		c = forceToColor(force)
 		vtx = GeomVertexWriter(self.vdata,  "vertex")
 		cx  = GeomVertexWriter(self.vdata,  "color")
-		vtx.setRow(indx)
-		cx.setRow(indx)
-		c = self.forceToColor(force)
-		vtx.addData3f(x0a, y0a, self.zpos)
-		vtx.addData3f(x1a, y1a, self.zpos)
+		if action == SKID_EXTEND:
+			# Only the far end of the last rectangle moves
+			indx = self.lastrect*4 + 2
+			vtx.setRow(indx)
+			cx.setRow(indx)
+		else:
+			indx = self.nextrect*4
+			self.lastrect = self.nextrect
+			self.nextrect += 1
+			if self.nextrect >= self.nrects:
+				self.nextrect = 0
+			vtx.setRow(indx)
+			cx.setRow(indx)
+			vtx.addData3f(x0a, y0a, self.zpos)
+			vtx.addData3f(x1a, y1a, self.zpos)
+			cx.addData4f(*c)
+			cx.addData4f(*c)
 		vtx.addData3f(x0b, y0b, self.zpos)
 		vtx.addData3f(x1b, y1b, self.zpos)
 		cx.addData4f(*c)
 		cx.addData4f(*c)
-		cx.addData4f(*c)
-		cx.addData4f(*c)
+
+SKID_VERTEX_SHADER = """
+#version 120
+uniform mat4 p3d_ModelViewProjectionMatrix;
+uniform float osg_FrameTime;
+uniform float fade_time;
+attribute vec4 p3d_Vertex;
+attribute vec4 p3d_Color;
+attribute float birth;
+varying vec4 color;
+void main() {
+	gl_Position = p3d_ModelViewProjectionMatrix * p3d_Vertex;
+	float age = (osg_FrameTime - birth) / fade_time;
+	color = vec4(p3d_Color.rgb, p3d_Color.a * clamp(1.0 - age, 0.0, 1.0));
+}
+"""
+
+SKID_FRAGMENT_SHADER = """
+#version 120
+varying vec4 color;
+void main() {
+	gl_FragColor = color;
+}
+"""
+
+# One rectangle is four rows of: x, y, z, r, g, b, a, birth time
+SKID_RECT = struct.Struct("<" + "8f" * 4)
+# The far end of a rectangle is its last two rows
+SKID_END = struct.Struct("<" + "8f" * 2)
+
+class SkidMarks:
+	"""
+	SkidMarks maintains the skid marks of any number of wheels in one vertex buffer, which is drawn
+	with a single draw call.  Every vertex holds the time it was laid down, and a shader fades the
+	marks out from that and the frame time, so old marks never have to be rewritten.
+	"""
+	def __init__(self, nwheels=4, nrects=1200, wheel_width=0.2, zpos=-0.4, fade_time=20.0,
+				min_distance=0.1, min_angle=5.0, max_length=5.0):
+		"""
+		Sets up the marks for 'nwheels' wheels, numbered from zero.  The wheels share a ring of 'nrects'
+		rectangles, so once that many have been added, the oldest ones are reused.  Marks fade out
+		completely 'fade_time' seconds after they are added.  The other arguments are as in SkidTrack.
+		"""
+		self.wheel_width = wheel_width
+		self.nrects = nrects
+		self.zpos = zpos
+		array_format = GeomVertexArrayFormat()
+		array_format.addColumn(InternalName.getVertex(), 3, Geom.NT_float32, Geom.C_point)
+		array_format.addColumn(InternalName.getColor(), 4, Geom.NT_float32, Geom.C_color)
+		array_format.addColumn(InternalName.make("birth"), 1, Geom.NT_float32, Geom.C_other)
+		self.vdata = GeomVertexData("skids", GeomVertexFormat.registerFormat(array_format), Geom.UHDynamic)
+		# New rows are zeroed, so every rectangle starts out with zero area
+		self.vdata.setNumRows(4*nrects)
+		# Two triangles per rectangle, drawn two-sided below, and never touched again
+		prim = GeomTriangles(Geom.UHStatic)
+		for i in range(nrects):
+			j = i * 4
+			prim.addVertices(j+0, j+1, j+3)
+			prim.addVertices(j+0, j+3, j+2)
+		geom = Geom(self.vdata)
+		geom.addPrimitive(prim)
+		node = GeomNode('SkidMarks')
+		node.addGeom(geom)
+		self.nodepath = render.attachNewNode(node)
+		self.nodepath.setTwoSided(True)
+		self.nodepath.setTransparency(TransparencyAttrib.MAlpha)
+		self.nodepath.setDepthWrite(False)
+		self.nodepath.setShader(Shader.make(Shader.SL_GLSL, SKID_VERTEX_SHADER, SKID_FRAGMENT_SHADER))
+		self.nodepath.setShaderInput("fade_time", fade_time)
+		self.clock = ClockObject.getGlobalClock()
+		self.nextrect = 0
+		self.nadded = 0
+		self.lastpoints = [None] * nwheels
+		# Ring index and self.nadded count of each wheel's last rectangle
+		self.lastrects = [(0, 0)] * nwheels
+		self.decimators = [SkidDecimator(min_distance, min_angle, max_length) for _ in range(nwheels)]
+
+	def addPoint(self, wheel, x, y, wheel_dir, force):
+		"""
+		Adds a point to the skid mark trail of the given wheel.  The other arguments are as in
+		SkidTrack.addPoint.  The new rectangle is written straight into the vertex buffer.
+		"""
+		action = self.decimators[wheel].addPoint(x, y, wheel_dir)
+		if action == SKID_SKIP:
+			return
+		h = self.wheel_width * 0.5
+		rads = (wheel_dir-90) * math.pi / 180.0
+		x0b, y0b = x + h*math.cos(rads), y + h*math.sin(rads)
+		rads = (wheel_dir+90) * math.pi / 180.0
+		x1b, y1b = x + h*math.cos(rads), y + h*math.sin(rads)
+		last = self.lastpoints[wheel]
+		self.lastpoints[wheel] = (x0b, y0b, x1b, y1b)
+		if action == SKID_START:
+			return
+		x0a, y0a, x1a, y1a = last
+		r, g, b, a = forceToColor(force)
+		t = self.clock.getFrameTime()
+		z = self.zpos
+		# modifyArray marks the rows as changed, so only this one buffer is sent to the GPU again
+		view = memoryview(self.vdata.modifyArray(0))
+		lastrect, added = self.lastrects[wheel]
+		# The wheel's last rectangle can only be stretched if the other wheels have not reused it
+		if action == SKID_EXTEND and self.nadded - added < self.nrects:
+			SKID_END.pack_into(view, lastrect * SKID_RECT.size + SKID_END.size,
+				x0b, y0b, z, r, g, b, a, t,
+				x1b, y1b, z, r, g, b, a, t)
+			return
+		self.lastrects[wheel] = (self.nextrect, self.nadded)
+		self.nadded += 1
+		SKID_RECT.pack_into(view, self.nextrect * SKID_RECT.size,
+			x0a, y0a, z, r, g, b, a, t,
+			x1a, y1a, z, r, g, b, a, t,
+			x0b, y0b, z, r, g, b, a, t,
+			x1b, y1b, z, r, g, b, a, t)
+		self.nextrect += 1
+		if self.nextrect >= self.nrects:
+			self.nextrect = 0
+
+	def clear(self, wheel=None):
+		"""
+		Starts a new trail for one wheel, or all wheels, so the next point is not joined to the last one
+		"""
+		wheels = range(len(self.lastpoints)) if wheel == None else [wheel]
+		for i in wheels:
+			self.lastpoints[i] = None
+			self.decimators[i].clear()
 
 class SkidTrackOld:
 	"""
@@ -6,10 +6,15 @@ from math import pi, sin, cos
 from direct.task import Task
 from panda3d.core import PointLight 
 from panda3d.core import VBase4
-from skid import SkidTrack
+from skid import SkidMarks
+import modelcache
 import math
 
 class SwerveBot:
+	# Models shared by every SwerveBot.  Each robot places instances of these under its own
+	# nodes, so the files are loaded once no matter how many robots or wheels there are.
+	templates = {}
+
 	def __init__(self):
 		self.frame_pos = (0, 0)
 		self.frame_dir = 0.0
@@ -17,30 +22,38 @@ class SwerveBot:
 		self.autoDriving = False
 		#taskMgr.add(self.autoDrive, "AutoDrive")
 
+	@classmethod
+	def loadTemplates(cls):
+		if not cls.templates:
+			for name in ["frame_1.obj", "caster_1.obj", "wheel_1.obj"]:
+				cls.templates[name] = modelcache.loadModel(loader, name)
+
 	def loadModel(self):
-		self.frame = loader.loadModel("frame_1.obj", noCache=True)
-		self.frame.reparentTo(render)
+		self.loadTemplates()
+		# The transforms are set on these placeholder nodes, never on the shared models
+		self.frame = render.attachNewNode("SwerveBot")
+		self.templates["frame_1.obj"].instanceTo(self.frame)
 		self.frame.setPos(0.0, 0.0, 0.0)
 		self.wheels = []  
-		self.skids = []
+		# All four wheels share one skid mark buffer
+		self.skids = SkidMarks(nwheels=4, nrects=1200, wheel_width=0.2, zpos=-0.4)
 		locs = [(-1.0, -1.0), (-1.0, 1.0), (1.0, 1.0), (1.0, -1.0)]
 		wnames = ["Back-Right", "Back-Left", "Front-Left", "Front-Right"]
 		for i in range(4):
-			caster = loader.loadModel("caster_1.obj", noCache=True)
 			x, y = locs[i]
 			sx, sy = 1.7, 1.7
 			name = wnames[i]
-			caster.reparentTo(self.frame)
+			caster = self.frame.attachNewNode(name)
+			self.templates["caster_1.obj"].instanceTo(caster)
 			caster.setX(x*sx)
 			caster.setY(y*sy)
 			caster.setZ(0.0)
-			wheel = loader.loadModel("wheel_1.obj", noCache=True)
-			wheel.reparentTo(caster)
+			wheel = caster.attachNewNode(name + "-Wheel")
+			self.templates["wheel_1.obj"].instanceTo(wheel)
 			wheel.setPos(0.0, 0.0, 0.0)
 			caster_angle = 0.0
 			wheel_turns = 0.0
 			self.wheels.append((caster, wheel, name))
-			self.skids.append(SkidTrack(nrects=300, wheel_width=0.2, zpos=-0.4))
 
 
 	def setPos(self, x, y, angle):
@@ -78,7 +91,7 @@ class SwerveBot:
 			#w = self.wheels[2]
 			caster, wheel, name = w 
 			x, y, angle = caster.getX(render), caster.getY(render), caster.getH(render)
-			self.skids[iskid].addPoint(x, y, angle, 1.0)
+			self.skids.addPoint(iskid, x, y, angle, 1.0)
 			iskid += 1
 
 
@@ -1 +1,2 @@
-pip install panda3d==1.10.3
\ No newline at end of file
+pip install panda3d==1.10.3
+pip install numpy
\ No newline at end of file
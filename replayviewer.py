@@ -0,0 +1,110 @@
+# replayviewer.py -- Scrubs through recorded telemetry sessions in the simulator
+#
+# The robot is placed straight from the recorded state of each tick, so seeking to any
+# time is immediate and physics is never re-run.  Keys:
+#   space        play / pause
+#   b            reverse the play direction
+#   = and -      double or halve the play speed
+#   arrows       seek back or forward SEEK_STEP seconds
+#   home, end    seek to the start or end of the session
+#
+import argparse
+
+from direct.task import Task
+
+import VisualAssets.graphs as graphs
+from Physics.physicsProcess import SwerveState
+from robotsim import RobotSim
+from Telemetry.keyframes import DEFAULT_TICKS_PER_KEY, KeyframeIndex
+from Telemetry.recorder import loadSession
+
+SEEK_STEP = 5.0
+MIN_SPEED = 1/16
+MAX_SPEED = 16
+
+class ReplayViewer (RobotSim) :
+	def __init__(self, session_path, ticks_per_key = DEFAULT_TICKS_PER_KEY, textboxes = ({}), graph_objs = {},
+	             capture_path = None, **kwargs):
+		self.index = KeyframeIndex(loadSession(session_path), ticks_per_key)
+		if capture_path:
+			kwargs.setdefault("capture_seconds", self.index.duration())
+		RobotSim.__init__(self, textboxes, graph_objs, capture_path=capture_path, **kwargs)
+		#The recorded state stands in for the physics engine, so the HUD and robot read it the same way
+		self.physics = SwerveState()
+		#Nothing is simulated, so physics profiles have nothing to change
+		self.taskMgr.remove("watchProfile")
+		self.ignore('l')
+		self.play_time = self.index.start
+		self.speed = 1.0
+		self.direction = 1
+		self.playing = True
+		self.accept('space', self.togglePlaying)
+		self.accept('b', self.reverse)
+		self.accept('=', self.changeSpeed, [2])
+		self.accept('-', self.changeSpeed, [0.5])
+		self.accept('arrow_left', self.seekBy, [-SEEK_STEP])
+		self.accept('arrow_right', self.seekBy, [SEEK_STEP])
+		self.accept('home', self.seek, [self.index.start])
+		self.accept('end', self.seek, [self.index.end])
+
+	def driveRobot(self, task):
+		"""
+		Task which advances the play time and shows the recorded state at it
+		"""
+		if self.playing:
+			delta_time = self.fixed_dt or globalClock.getDt()
+			self.play_time += delta_time*self.speed*self.direction
+			if not self.index.start < self.play_time < self.index.end:
+				#Stops at either end of the session
+				self.play_time = self.index.clamp(self.play_time)
+				self.playing = False
+		self.physics.setState(self.index.stateAt(self.play_time))
+		self.sim_time = self.play_time-self.index.start
+		self.setRobotToLocation()
+		return Task.cont
+
+	def seek(self, t):
+		self.play_time = self.index.clamp(t)
+		self.reportPlayback()
+
+	def seekBy(self, seconds):
+		self.seek(self.play_time+seconds)
+
+	def togglePlaying(self):
+		if not self.playing and self.play_time == (self.index.end if self.direction > 0 else self.index.start):
+			#Playing again from the end starts over
+			self.play_time = self.index.start if self.direction > 0 else self.index.end
+		self.playing = not self.playing
+		self.reportPlayback()
+
+	def reverse(self):
+		self.direction = -self.direction
+		self.reportPlayback()
+
+	def changeSpeed(self, factor):
+		self.speed = min(max(self.speed*factor, MIN_SPEED), MAX_SPEED)
+		self.reportPlayback()
+
+	def reportPlayback(self):
+		state = "playing" if self.playing else "paused"
+		direction = "forward" if self.direction > 0 else "reverse"
+		print("{:.2f}s of {:.2f}s, {} {} at {}x".format(self.play_time-self.index.start, self.index.duration(),
+		                                                  state, direction, self.speed))
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Plays back a recorded telemetry session")
+	parser.add_argument("session", help="session directory, such as sessions/20190809-120000")
+	parser.add_argument("--ticks-per-key", type=int, default=DEFAULT_TICKS_PER_KEY,
+	                    help="ticks between the keyframes used for seeking")
+	parser.add_argument("--capture", metavar="DIR",
+	                    help="render the whole session offscreen, writing every frame to DIR")
+	parser.add_argument("--fps", type=float, default=30, help="frames per second of session time when capturing")
+	parser.add_argument("--size", type=int, nargs=2, default=(1280, 720), metavar=("WIDTH", "HEIGHT"),
+	                    help="captured frame size")
+	args = parser.parse_args()
+	graphs = {"y_graph": graphs.XYGraph(location=(-.4,-.4)), "vector_graph": graphs.PolarGraph(location=(-.8, -.5))}
+	textboxes = {"frvector_label": {}, "frvector_value": {"location": (.4, .7)}}
+	app = ReplayViewer(args.session, args.ticks_per_key, textboxes, graphs, capture_path=args.capture,
+	                   capture_fps=args.fps, capture_size=args.size)
+	app.run()
@@ -3,25 +3,53 @@
 #
 from direct.showbase.ShowBase import ShowBase
 from math import pi, sin, cos, sqrt, atan2
+import argparse
+import atexit
+import os
+import sys
+import time
 from direct.task import Task
+from panda3d.core import ClockObject, loadPrcFileData
 from panda3d.core import PointLight 
 from panda3d.core import VBase4
 from panda3d.core import Mat4
 from panda3d.core import (Geom, GeomLinestrips, GeomNode, GeomVertexData,
                           GeomVertexFormat, GeomVertexWriter, InputDevice,
                           LineSegs, Point3, TextNode, TransparencyAttrib)
+#The code/ modules import each other by name, so code/ goes on the path before any of them load
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "code"))
 from code.swervebot import SwerveBot
-from code.cones import Cones
+from code.cones import ConeField
+import code.modelcache as modelcache
+from overlay import Overlay
 
 import VisualAssets.graphs as graphs
+import VisualAssets.hud as hud
+from VisualAssets.capture import FrameCapture
+from VisualAssets.hud import HudLines, HudText
+import Physics.headless as headless
+import Physics.manageParams as manageParams
 import Physics.primitivePhysics as physics
+from Physics.physicsProcess import RemoteSwerve
 
 import Input.joy as joy
+import Input.replay as replay
+from Telemetry.profiler import TaskProfiler
+from Telemetry.recorder import TelemetryRecorder
 
 class RobotSim (ShowBase) :
-	def __init__(self, textboxes = ({}), graph_objs = {}, default_text_scale = .07):
+	def __init__(self, textboxes = ({}), graph_objs = {}, default_text_scale = .07, telemetry_path = None,
+	             input_log_path = None, replay_path = None, fixed_dt = None, physics_rate = None,
+	             profile = manageParams.DEFAULT_PROFILE, capture_path = None, capture_fps = 30,
+	             capture_size = (1280, 720), capture_seconds = None, trace = None):
+		#With a capture_path, frames are rendered offscreen as fast as possible and written there
+		#Simulated time advances by 1/capture_fps every frame, whatever the real frame rate is
+		if capture_path:
+			loadPrcFileData("capture", "window-type offscreen\nwin-size {} {}\nsync-video #f\naudio-library-name null"
+			                .format(*capture_size))
+			fixed_dt = 1/capture_fps
 		ShowBase.__init__(self)
-		self.scene = self.loader.loadModel("field_1.obj", noCache=True)
+		self.scene = modelcache.loadModel(self.loader, "field_1.obj")
 		# Reparent the model to render.
 		self.scene.reparentTo(self.render)
 		self.scene.setPos(0, 0, 0)
@@ -34,12 +62,33 @@ class RobotSim (ShowBase) :
 
 		self.setupCones()
 		#Joystick setup
-		self.joys = self.devices.getDevices(InputDevice.DeviceClass.gamepad)
-    #Attaches input devices to base
-		for ind, joy in enumerate(self.joys):
-			self.attachInputDevice(joy, prefix=str(ind))
-		#Joystick reading variable
-		self.joystick_readings = []
+		#Gamepads are attached as they connect, each with a reader that resolves its controls once
+		self.joys = []
+		self.joystick_readers = []
+		#Event prefix of the next gamepad, never reused so a reconnect cannot share a live gamepad's prefix
+		self.next_device_prefix = 0
+		#Joystick reading variable, one reading per attached gamepad
+		#A neutral reading stands in while no gamepad is connected
+		self.joystick_readings = [joy.neutralReadings()]
+		for device in self.devices.getDevices(InputDevice.DeviceClass.gamepad):
+			self.connectDevice(device)
+		self.accept("connect-device", self.connectDevice)
+		self.accept("disconnect-device", self.disconnectDevice)
+		#Joystick samples are logged to input_log_path, or replayed from replay_path instead of read
+		self.input_recorder = None
+		if input_log_path:
+			self.input_recorder = replay.InputRecorder(input_log_path)
+			atexit.register(self.input_recorder.close)
+		self.replay = None
+		if replay_path:
+			self.replay = replay.ReplayDevice(replay_path)
+			if fixed_dt == None:
+				fixed_dt = replay.DEFAULT_DT
+		#A trace of (seconds, x, y, z) segments drives the robot instead of the joysticks
+		self.trace = trace
+		#With a fixed_dt, physics steps by that much every frame instead of following the wall clock
+		self.fixed_dt = fixed_dt
+		self.sim_time = 0
 		#Text boxes which will be rendered every frame
     #Key is a node name, value is a dict with
     #arguments such as text, location, and scale
@@ -48,8 +97,6 @@ class RobotSim (ShowBase) :
 			self.textboxes = textboxes[0]
 		else:
 			self.textboxes = textboxes
-		self.textNodes = {}
-		self.textNodePaths = {}
 		self.default_text_scale = default_text_scale
 		self.text_is_active = False
     #If the text toggle button has been up for more than one frame
@@ -57,38 +104,76 @@ class RobotSim (ShowBase) :
     #If changes that need to be made on text have taken place
 		self.text_toggled = True
 		#Graph drawing data
-		#Lines to be rendered on the next frame
-		self.lines = []
-		self.lineNodes = []
-		self.lineNodePaths = []
 		self.graphs = graph_objs
 		for graph in self.graphs:
 			self.graphs[graph].dummyUpdate()
 		#Init physics engine
-		self.physics = physics.Swerve()
-		#Geometry drawing node
-		self.geom_node = GeomNode("drawer")
-		self.aspect2d.attach_new_node(self.geom_node)
-		#Tasks
-		self.taskMgr.add(self.updateJoysticks, "updateJoysticks")
-		self.taskMgr.add(self.driveRobot, "driveRobot")
-		self.taskMgr.add(self.updateHud, "updateHud")
-		self.taskMgr.add(self.toggleHud, "toggleHud")
+		#Parameters come from a profile, which is reloaded whenever its file is saved
+		self.profile_watcher = manageParams.ProfileWatcher(profile)
+		#With a physics_rate, physics runs in its own process at that many steps per second
+		if physics_rate:
+			self.physics = RemoteSwerve(physics_rate, model=self.profile_watcher.model)
+			atexit.register(self.physics.close)
+		else:
+			#Wall clock frames can hitch and captured frames may be further apart than a replay's samples,
+			#so both are sub-stepped to match them. Other fixed timesteps are stepped as given
+			max_dt = replay.DEFAULT_DT if capture_path or not fixed_dt else None
+			self.physics = physics.Swerve(model=self.profile_watcher.model, max_dt=max_dt)
+		#Per-tick telemetry, written to telemetry_path if one is given
+		self.telemetry = None
+		if telemetry_path:
+			self.telemetry = TelemetryRecorder(telemetry_path)
+			atexit.register(self.telemetry.close)
+		#Graph lines, kept in persistent vertex buffers
+		self.hud_lines = HudLines(self.aspect2d)
+		#Text nodes, only updated when their text box changes
+		self.hud_text = HudText(self.aspect2d, self.default_text_scale)
+		#Tasks, each timed by the profiler
+		self.profiler = TaskProfiler()
+		self.profiler.start(self.taskMgr)
+		self.profiler.addTask(self.taskMgr, self.updateJoysticks, "updateJoysticks")
+		self.profiler.addTask(self.taskMgr, self.driveRobot, "driveRobot")
+		self.profiler.addTask(self.taskMgr, self.updateHud, "updateHud")
+		self.profiler.addTask(self.taskMgr, self.toggleHud, "toggleHud")
+		self.profiler.addTask(self.taskMgr, self.watchProfile, "watchProfile")
+		self.capture = None
+		if capture_path:
+			self.startCapture(capture_path, capture_seconds)
+		#p shows the timings in the overlay, o saves them as a Chrome trace next to the telemetry
+		self.trace_path = os.path.join(telemetry_path or "", "trace.json")
+		self.accept('p', self.toggleProfiler)
+		self.accept('o', self.exportTrace)
 		self.accept('r', self.reportStatus)
 		self.accept('i', self.resetSim)
 		self.accept('a', self.robot.toggleAutoDrive)
+		self.accept('l', self.nextProfile)
 
 
 	def driveRobot(self, task):
 		"""
 		Task to drive the robot
 		"""
-		x = self.joystick_readings[0]["axes"]["left_x"]
-		y = self.joystick_readings[0]["axes"]["left_y"]
-		z = self.joystick_readings[0]["axes"]["right_x"]
+		#Telemetry records the axes which produced the controls actually sent
+		if self.trace:
+			x, y, z = headless.traceControls(self.trace, self.sim_time)
+			axes = replay.controlAxes(x, y, z)
+		else:
+			x, y, z = replay.readControls(self.joystick_readings[0])
+			axes = self.joystick_readings[0]["axes"]
 		self.physics.sendControls(x, y, z)
-		self.physics.update()
+		if self.fixed_dt:
+			self.physics.step(self.fixed_dt)
+			self.sim_time += self.fixed_dt
+		elif isinstance(self.physics, RemoteSwerve):
+			#Interpolates between the latest states published by the physics process
+			self.physics.update()
+			self.sim_time = self.physics.sim_time
+		else:
+			self.physics.update()
+			self.sim_time = task.time
 		self.setRobotToLocation()
+		if self.telemetry:
+			self.telemetry.recordSwerve(self.sim_time, self.physics, axes)
 		return Task.cont
 
 	def setRobotToLocation(self):
@@ -108,15 +193,43 @@ class RobotSim (ShowBase) :
 		self.robot.setWheelTurns(wheel_angle_1, wheel_angle_2, wheel_angle_3, wheel_angle_4)
 
 	def updateJoysticks(self, task):
-		joystick_readings = []
-		for joystick in self.joys:
-			joystick_readings.append(joy.readJoystickValues(joystick))
-		self.joystick_readings = joystick_readings
+		if self.replay:
+			self.joystick_readings = self.replay.readingsAt(self.sim_time)
+			return Task.cont
+		for reader in self.joystick_readers:
+			reader.read()
+		if self.input_recorder:
+			for ind, readings in enumerate(self.joystick_readings):
+				self.input_recorder.record(task.time, ind, readings)
 		return Task.cont
 
+	def connectDevice(self, device):
+		"""
+		Attaches a newly connected gamepad and starts reading it
+		"""
+		if device.device_class != InputDevice.DeviceClass.gamepad or device in self.joys:
+			return
+		self.attachInputDevice(device, prefix=str(self.next_device_prefix))
+		self.next_device_prefix += 1
+		self.joys.append(device)
+		self.joystick_readers.append(joy.JoystickReader(device))
+		self.joystick_readings = [reader.readings for reader in self.joystick_readers]
+
+	def disconnectDevice(self, device):
+		"""
+		Stops reading a gamepad which has been unplugged
+		"""
+		if device not in self.joys:
+			return
+		self.detachInputDevice(device)
+		ind = self.joys.index(device)
+		self.joys.pop(ind)
+		self.joystick_readers.pop(ind)
+		self.joystick_readings = [reader.readings for reader in self.joystick_readers]
+		if not self.joystick_readings:
+			self.joystick_readings = [joy.neutralReadings()]
+
 	def updateHud(self, task):
-		#Removes all lines from the geometry node
-		self.geom_node.removeAllGeoms()
 		if self.text_is_active:
 			frvector = "Mag: {}\nDir: {}\nTheta_acc: {}\nVel_x: {}\nVel_y: {}\nVel_t: {}\nPos: {}, {}\nRot: {}".format(round(self.physics.vectors["frame"].magnitude, 4),
 															round(self.physics.vectors["frame"].direction, 4),
@@ -128,26 +241,11 @@ class RobotSim (ShowBase) :
 															round(self.physics.position[1], 4),
 															round(self.physics.position[2], 4))
 			self.textboxes["frvector_value"]["text"] = frvector
-			self.lines = []
 			for graph_name in self.graphs:
 				lines, strings = self.graphs[graph_name].render()
-        #Splits the lines into pairs of points and assigns them to self.lines
-				for line in lines:
-					self.lines += pairPoints(line)
-        #Clears all graph generated strings from textboxes
-				deleted = []
-				for key in self.textboxes:
-					if graph_name in key:
-						deleted.append(key)
-				for key in deleted:
-					self.textboxes.pop(key)
-        #Processes strings into textboxes
-				for ind, val in enumerate(strings):
-					location, string = val
-					self.textboxes["{}_{}".format(graph_name, str(ind))] = {"location": location, "text": string}
-			self.manageTextNodes()
-			self.renderText()
-			self.manageGeometry()
+				self.hud_lines.setLines(graph_name, lines)
+				hud.setGraphLabels(self.textboxes, graph_name, strings)
+			self.hud_text.setTextboxes(self.textboxes)
 		return Task.cont
 
 	def toggleHud(self, task):
@@ -159,15 +257,12 @@ class RobotSim (ShowBase) :
 			self.text_button_lifted = True
 		if not self.text_toggled:
 			if not self.text_is_active:
-				for path in self.textNodePaths:
-					self.textNodePaths[path].detachNode()
-				for path in self.lineNodePaths:
-					path.detachNode()
+				self.hud_text.hide()
+				self.hud_lines.hide()
 			else:
-				for node in self.textNodes:
-					self.textNodePaths[node] = self.aspect2d.attachNewNode(self.textNodes[node])
-				for node in self.lineNodes:
-					self.aspect2d.attachNewNode(node)
+				self.hud_text.show()
+				self.hud_lines.show()
+			self.text_toggled = True
 		return Task.cont
 		
 	def resetSim(self):
@@ -183,7 +278,7 @@ class RobotSim (ShowBase) :
 		#self.resetCamPosition()
 
 	def insertLight(self, name, x, y, z):
-		lightball = self.loader.loadModel("lightball_1.obj", noCache=True)
+		lightball = modelcache.loadModel(self.loader, "lightball_1.obj")
 		lightball.reparentTo(self.render)
 		lightball.setPos(x, y, z)
 		plight = PointLight(name)
@@ -193,14 +288,62 @@ class RobotSim (ShowBase) :
 		self.render.setLight(plnp)
 
 	def setupCones(self):
-		self.cones = []
+		self.cones = ConeField()
 		conepos = [(20, 20), (18, 0)]
 		for cp in conepos:
-			c = Cones()
-			c.loadModel()
 			x, y = cp
-			c.setPos(x, y)
-			self.cones.append(c)
+			self.cones.addCone(x, y)
+		#The cones never move, so they are merged into one batch
+		self.cones.flatten()
+
+	def watchProfile(self, task):
+		"""
+		Swaps in the profile's model when its file changes
+		Tasks run one after another, so the swap always falls between two physics steps
+		"""
+		model = self.profile_watcher.poll()
+		if model != None:
+			self.physics.setModel(model)
+			print("Reloaded physics profile", model.name)
+		return Task.cont
+
+	def nextProfile(self):
+		try:
+			model = self.profile_watcher.nextProfile()
+		except manageParams.LOAD_ERRORS as error:
+			print("Could not load physics profile:", error)
+			return
+		self.physics.setModel(model)
+		print("Switched to physics profile", model.name)
+
+	def startCapture(self, path, seconds = None):
+		"""
+		Writes every rendered frame to path, stopping the app after seconds of simulated time
+		Replays and traces stop at their end if no seconds are given
+		"""
+		globalClock.setMode(ClockObject.MNonRealTime)
+		globalClock.setDt(self.fixed_dt)
+		if seconds == None and self.trace:
+			seconds = sum(segment[0] for segment in self.trace)
+		if seconds == None and self.replay:
+			seconds = self.replay.duration()
+		self.capture_seconds = seconds
+		self.capture = FrameCapture(self.win, path)
+		#Runs after igLoop has rendered the frame
+		self.profiler.addTask(self.taskMgr, self.captureFrame, "captureFrame", sort=60)
+
+	def captureFrame(self, task):
+		self.capture.capture()
+		if self.capture_seconds != None and self.sim_time >= self.capture_seconds:
+			print("Wrote", self.capture.close(), "frames to", self.capture.directory)
+			self.userExit()
+		return Task.cont
+
+	def toggleProfiler(self):
+		self.profiler.toggleOverlay(Overlay())
+
+	def exportTrace(self):
+		print("Wrote task timings to", self.profiler.exportTrace(self.trace_path))
 
 	def reportStatus(self):
 		x=base.camera.getX()
@@ -220,29 +363,40 @@ class RobotSim (ShowBase) :
 		base.camera.setPos(x, y, z)
 		base.camera.setHpr(h, p, r)
 
-def pairPoints(points, closed=False):
-	"""
-	Seperates a series of points into a series of lines connecting the points
-	"""
-	pairs = []
-	for ind, point in enumerate(points):
-		if ind == len(points)-1:
-			#If on the last point of the set
-			#break the loop or link back to the start
-			#depending on arguments
-			if closed:
-				pairs.append((point, points[0]))
-			else:
-				break
-		else:
-			#If not on the last point, add the next line as a pair of points
-			pairs.append((point, points[ind+1]))
-	return pairs
-
-
-graphs = {"y_graph": graphs.XYGraph(location=(-.4,-.4)), "vector_graph": graphs.PolarGraph(location=(-.8, -.5))}
-textboxes = {"frvector_label": {}, "frvector_value": {"location": (.4, .7)}}
-app = RobotSim(textboxes, graphs)
 
-app.run()
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Swerve drive robot simulator")
+	parser.add_argument("--replay", help="joystick log to replay instead of reading the joysticks")
+	parser.add_argument("--dt", type=float, default=None, help="fixed physics timestep in seconds")
+	parser.add_argument("--physics-rate", type=float, default=None,
+	                    help="run physics in a separate process at this many steps per second, such as 1000")
+	parser.add_argument("--trace", help="csv file of 'seconds, x, y, z' control segments to drive instead of the joysticks")
+	parser.add_argument("--capture", metavar="DIR",
+	                    help="render offscreen without a window, writing every frame to DIR as fast as possible")
+	parser.add_argument("--fps", type=float, default=30, help="frames per simulated second when capturing")
+	parser.add_argument("--size", type=int, nargs=2, default=(1280, 720), metavar=("WIDTH", "HEIGHT"),
+	                    help="captured frame size")
+	parser.add_argument("--seconds", type=float, default=None,
+	                    help="simulated seconds to capture, defaults to the length of the replay or trace")
+	parser.add_argument("--profile", default=manageParams.DEFAULT_PROFILE, choices=manageParams.listProfiles(),
+	                    help="physics parameter profile from Physics/profiles, l cycles through them while running")
+	args = parser.parse_args()
+	if args.physics_rate and (args.replay or args.dt or args.capture):
+		parser.error("--physics-rate runs in real time, so it can not be combined with --replay, --dt or --capture")
+	if args.capture and not (args.replay or args.trace or args.seconds):
+		parser.error("--capture needs a --replay, --trace or --seconds to know when to stop")
+	if args.replay and args.trace:
+		parser.error("--replay and --trace both drive the robot, choose one")
+	graphs = {"y_graph": graphs.XYGraph(location=(-.4,-.4)), "vector_graph": graphs.PolarGraph(location=(-.8, -.5))}
+	textboxes = {"frvector_label": {}, "frvector_value": {"location": (.4, .7)}}
+	#Every run records its telemetry and joystick input into a new session directory
+	session = os.path.join("sessions", time.strftime("%Y%m%d-%H%M%S"))
+	os.makedirs(session, exist_ok=True)
+	app = RobotSim(textboxes, graphs, telemetry_path=session,
+	               input_log_path=os.path.join(session, "input.joylog"),
+	               replay_path=args.replay, fixed_dt=args.dt, physics_rate=args.physics_rate,
+	               profile=args.profile, capture_path=args.capture, capture_fps=args.fps,
+	               capture_size=args.size, capture_seconds=args.seconds,
+	               trace=headless.loadTrace(args.trace) if args.trace else None)
+	app.run()
 